@@ -0,0 +1,74 @@
+import glob
+import json
+import os
+import threading
+import time
+
+from batch_writer import BatchWriter
+
+
+class AnswerEventLog:
+    """Journal append-only des réponses, écrit par lots dans des segments JSONL
+
+    Chaque worker écrit ses propres segments (le pid fait partie du nom) et passe
+    au segment suivant dès que le courant dépasse max_segment_bytes.
+    """
+
+    def __init__(self, directory, max_segment_bytes=64 * 1024 * 1024, batch_size=500,
+                 max_queue=50000, interval=1.0, fsync=True):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self.dropped = 0   # événements perdus parce que la file était pleine
+        self.written = 0
+        self._segment = None
+        self._segment_index = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._writer = BatchWriter(self._write_batch, batch_size=batch_size, max_queue=max_queue,
+                                   interval=interval, submit_timeout=0, name='answer-log')
+
+    @property
+    def depth(self):
+        return self._writer.depth
+
+    def record(self, event):
+        """Met un événement en file, sans jamais bloquer la requête"""
+        if not self._writer.submit(event):
+            with self._lock:
+                self.dropped += 1
+
+    def _open_segment(self):
+        self._segment_index += 1
+        name = f"answers-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._segment_index:04d}.jsonl"
+        return open(os.path.join(self.directory, name), 'ab')
+
+    def _write_batch(self, events):
+        data = b''.join(json.dumps(event, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+                        for event in events)
+        if self._segment is None or self._segment.tell() + len(data) > self.max_segment_bytes:
+            if self._segment is not None:
+                self._segment.close()
+            self._segment = self._open_segment()
+        self._segment.write(data)
+        self._segment.flush()
+        if self.fsync:
+            os.fsync(self._segment.fileno())
+        with self._lock:
+            self.written += len(events)
+
+    def close(self):
+        """Écrit les événements en attente puis ferme le segment courant"""
+        self._writer.close()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+
+def read_events(directory):
+    """Rejoue tous les événements du journal, segment par segment dans l'ordre des noms"""
+    for path in sorted(glob.glob(os.path.join(directory, 'answers-*.jsonl'))):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.endswith('\n'):  # une dernière ligne incomplète est ignorée
+                    yield json.loads(line)
@@ -0,0 +1,94 @@
+import re
+import unicodedata
+
+# Articles ignorés en tête de réponse : "La rétine" et "rétine" sont équivalents
+_LEADING_ARTICLES = {'le', 'la', 'les', 'l', 'un', 'une', 'des', 'du', 'de', 'd'}
+_WORD = re.compile(r'[a-z0-9]+')
+# Chiffres romains : "Louis XIV" et "Louis XVI" sont deux réponses différentes
+_ROMAN_NUMERAL = re.compile(r'[ivxlcdm]+')
+# Un mot doit compter au moins autant de lettres pour tolérer une faute ("Mercure" et
+# "Mercury" restent distincts), puis une faute de plus par tranche de cette longueur
+FUZZY_WORD_LENGTH = 8
+
+
+def normalize_answer(text):
+    """Supprime accents, ponctuation, casse et article initial d'une réponse"""
+    text = unicodedata.normalize('NFD', str(text)).encode('ascii', 'ignore').decode('ascii').lower()
+    words = _WORD.findall(text)
+    while len(words) > 1 and words[0] in _LEADING_ARTICLES:
+        words.pop(0)
+    return ' '.join(words)
+
+
+def bounded_edit_distance(a, b, limit):
+    """Distance de Levenshtein entre a et b, ou limit + 1 dès qu'elle dépasse limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+
+    too_far = limit + 1
+    previous = [j if j <= limit else too_far for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        # Seule la bande diagonale de largeur 2 * limit + 1 peut rester sous la limite
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= limit else too_far
+        row_min = current[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return too_far
+        previous = current
+    return min(previous[-1], too_far)
+
+
+def _word_limit(word, tolerance):
+    """Fautes tolérées sur un mot de la réponse attendue"""
+    if word.isdigit() or _ROMAN_NUMERAL.fullmatch(word):
+        return 0
+    return min(tolerance, len(word) // FUZZY_WORD_LENGTH)
+
+
+def _words_match(answer_words, form_words, tolerance):
+    """Compare mot à mot, avec au total `tolerance` fautes au plus, réparties selon _word_limit"""
+    if len(answer_words) != len(form_words):
+        return False
+    budget = tolerance
+    for answer_word, form_word in zip(answer_words, form_words):
+        if answer_word == form_word:
+            continue
+        limit = min(budget, _word_limit(form_word, tolerance))
+        if not limit:
+            return False
+        distance = bounded_edit_distance(answer_word, form_word, limit)
+        if distance > limit:
+            return False
+        budget -= distance
+    return True
+
+
+class AnswerMatcher:
+    """Réponses acceptées pour une question, normalisées une fois pour toutes"""
+    __slots__ = ('forms', 'word_forms', 'tolerance')
+
+    def __init__(self, correct_answer, aliases=(), tolerance=0):
+        self.forms = frozenset(normalize_answer(answer) for answer in (correct_answer, *aliases))
+        self.word_forms = [form.split() for form in self.forms]
+        self.tolerance = tolerance
+
+    def matches(self, user_answer):
+        """Vrai si la réponse est l'une des formes acceptées, à `tolerance` fautes près"""
+        normalized = normalize_answer(user_answer)
+        if not normalized:
+            return False
+        if normalized in self.forms:
+            return True
+        if not self.tolerance:
+            return False
+        # Fautes comptées par mot : deux mots distincts ne sont jamais confondus
+        words = normalized.split()
+        return any(_words_match(words, form_words, self.tolerance) for form_words in self.word_forms)
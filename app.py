@@ -1,28 +1,125 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from quiz_database import QuizDatabase, QuestionType
+from answer_log import AnswerEventLog
+from duel_game import DuelGame
+from game_session import GameSession
+from game_store import SessionReaper, create_game_store
+from game_token import GameTokenSigner, InvalidGameToken
+from lobby import LobbyNotifier
+from metrics import REGISTRY, REQUEST_SECONDS, Gauge
+from password_hashing import PasswordHasher, PasswordHasherBusy
+from question_import import import_questions
+from question_payload import json_response_bytes
+from room_registry import RoomRegistry
+import atexit
+import os
 import random
 import json
+import math
 import time
-import unicodedata
 
 app = Flask(__name__)
 CORS(app)
 
-# Fonction pour normaliser une chaîne (supprime les accents et met en minuscules)
-def normalize_string(input_string):
-    return unicodedata.normalize('NFD', input_string).encode('ascii', 'ignore').decode('utf-8').lower()
+# Initialisation de la base de données
+db = QuizDatabase(
+    os.environ.get('QUIZ_DB_PATH', 'quiz.db'),
+    pool_size=int(os.environ.get('QUIZ_DB_POOL_SIZE', 5)),
+    busy_timeout=float(os.environ.get('QUIZ_DB_BUSY_TIMEOUT', 5.0)),
+    usage_flush_interval=float(os.environ.get('QUIZ_USAGE_FLUSH_INTERVAL', 5.0)),
+    usage_flush_size=int(os.environ.get('QUIZ_USAGE_FLUSH_SIZE', 500)),
+    leaderboard_size=int(os.environ.get('QUIZ_LEADERBOARD_SIZE', 100)),
+    leaderboard_refresh=float(os.environ.get('QUIZ_LEADERBOARD_REFRESH', 1.0)),
+    question_refresh=float(os.environ.get('QUIZ_QUESTION_REFRESH', 5.0)),
+    score_batch_size=int(os.environ.get('QUIZ_SCORE_BATCH_SIZE', 100)),
+    score_queue_size=int(os.environ.get('QUIZ_SCORE_QUEUE_SIZE', 10000)),
+    password_hasher=PasswordHasher(
+        workers=int(os.environ.get('QUIZ_HASH_WORKERS', 2)),
+        max_pending=int(os.environ.get('QUIZ_HASH_QUEUE', 4)),
+        n=int(os.environ.get('QUIZ_SCRYPT_N', 2 ** 14)),
+        r=int(os.environ.get('QUIZ_SCRYPT_R', 8)),
+        p=int(os.environ.get('QUIZ_SCRYPT_P', 1))
+    ),
+    # Journal des requêtes lentes, désactivé tant que QUIZ_SLOW_QUERY_MS n'est pas défini
+    slow_query_threshold=(float(os.environ['QUIZ_SLOW_QUERY_MS']) / 1000
+                          if os.environ.get('QUIZ_SLOW_QUERY_MS') else None)
+)
+atexit.register(db.close)
 
-# Fonction pour vérifier si la réponse est correcte
-def is_correct_answer(user_answer, correct_answer):
-    return normalize_string(user_answer) == normalize_string(correct_answer)
+# Parties en cours et salons de duel, en mémoire ou partagés entre workers (QUIZ_GAME_STORE)
+active_games = create_game_store(
+    'games',
+    ttl=float(os.environ.get('QUIZ_GAME_TTL', 1800)),
+    max_entries=int(os.environ.get('QUIZ_MAX_GAMES', 10000)),
+    encode=GameSession.to_dict,
+    decode=GameSession.from_dict
+)
+duel_rooms = create_game_store(
+    'rooms',
+    ttl=float(os.environ.get('QUIZ_ROOM_TTL', 3600)),
+    max_entries=int(os.environ.get('QUIZ_MAX_ROOMS', 2000))
+)
+# Journal append-only des réponses ; QUIZ_ANSWER_LOG_DIR vide le désactive
+answer_log = None
+if os.environ.get('QUIZ_ANSWER_LOG_DIR', 'answer_log'):
+    answer_log = AnswerEventLog(
+        os.environ.get('QUIZ_ANSWER_LOG_DIR', 'answer_log'),
+        max_segment_bytes=int(os.environ.get('QUIZ_ANSWER_LOG_SEGMENT_MB', 64)) * 1024 * 1024,
+        batch_size=int(os.environ.get('QUIZ_ANSWER_LOG_BATCH_SIZE', 500))
+    )
+    atexit.register(answer_log.close)
 
-# Initialisation de la base de données
-db = QuizDatabase('quiz.db')
+room_registry = RoomRegistry(
+    duel_rooms,
+    code_digits=int(os.environ.get('QUIZ_ROOM_CODE_DIGITS', 4)),
+    capacity=int(os.environ.get('QUIZ_ROOM_CAPACITY', 50))
+)
+lobby_notifier = LobbyNotifier(duel_rooms)
+
+# Parties solo sans état serveur : activées par un secret partagé entre tous les workers.
+# La protection contre le rejeu n'est sûre qu'avec un stockage commun à tous les workers :
+# avec QUIZ_GAME_STORE=memory, un jeton déjà joué serait accepté par un autre worker.
+game_tokens = None
+if os.environ.get('QUIZ_GAME_TOKEN_SECRET'):
+    if os.environ.get('QUIZ_GAME_STORE', 'memory') != 'sqlite':
+        raise ValueError("QUIZ_GAME_TOKEN_SECRET exige QUIZ_GAME_STORE=sqlite")
+    game_tokens = GameTokenSigner(
+        os.environ['QUIZ_GAME_TOKEN_SECRET'],
+        # Dernière étape jouée de chaque partie, pour refuser le rejeu d'un ancien jeton
+        create_game_store('used_tokens',
+                          ttl=float(os.environ.get('QUIZ_GAME_TTL', 1800)),
+                          max_entries=int(os.environ.get('QUIZ_MAX_USED_TOKENS', 200000))),
+        max_age=float(os.environ.get('QUIZ_GAME_TTL', 1800))
+    )
+
+REGISTRY.register(Gauge('quiz_active_games', "Parties solo en cours", lambda: len(active_games)))
+REGISTRY.register(Gauge('quiz_duel_rooms', "Salons de duel ouverts", lambda: len(duel_rooms)))
+REGISTRY.register(Gauge('quiz_games_evicted_total', "Parties purgées ou évincées",
+                        lambda: active_games.evictions, kind='counter'))
+REGISTRY.register(Gauge('quiz_rooms_evicted_total', "Salons purgés ou évincés",
+                        lambda: duel_rooms.evictions, kind='counter'))
+REGISTRY.register(Gauge('quiz_score_queue_depth', "Scores en attente d'écriture",
+                        lambda: db.score_writer.depth))
+if answer_log is not None:
+    REGISTRY.register(Gauge('quiz_answer_log_queue_depth', "Réponses en attente d'écriture dans le journal",
+                            lambda: answer_log.depth))
+    REGISTRY.register(Gauge('quiz_answer_log_dropped_total', "Réponses perdues, file du journal pleine",
+                            lambda: answer_log.dropped, kind='counter'))
+REGISTRY.register(Gauge('quiz_password_hash_pending', "Hachages de mots de passe en cours",
+                        lambda: db.password_hasher.pending))
+
+# Taille maximale d'une page de classement et du voisinage d'un joueur
+LEADERBOARD_PAGE_MAX = 100
 
-# Structure pour stocker les parties en cours
-active_games = {}
-duel_rooms = {}
+# Durée maximale d'attente d'une requête long-poll, et intervalle des commentaires keep-alive SSE
+LOBBY_LONG_POLL_MAX = 25
+LOBBY_HEARTBEAT = 15
+
+session_reaper = SessionReaper(
+    [active_games, duel_rooms] + ([game_tokens.used_tokens] if game_tokens else []),
+    interval=float(os.environ.get('QUIZ_REAPER_INTERVAL', 60))
+)
 
 def initialize_test_data():
     """Initialise les données de test"""
@@ -35,12 +132,7 @@ def initialize_test_data():
     ]
     
     for theme_name in themes:
-        db.cursor.execute("INSERT OR IGNORE INTO themes (theme_name) VALUES (?)", (theme_name,))
-    
-    theme_ids = {}
-    for theme_name in themes:
-        db.cursor.execute("SELECT theme_id FROM themes WHERE theme_name = ?", (theme_name,))
-        theme_ids[theme_name] = db.cursor.fetchone()[0]
+        db.add_theme(theme_name)
 
     # Ajout des questions de test
     test_questions = {
@@ -67,6 +159,7 @@ def initialize_test_data():
                 "type": QuestionType.OPEN,
                 "question": "Qui a été le premier empereur de France ?",
                 "correct": "Napoléon",
+                "aliases": ["Napoléon Bonaparte", "Napoléon Ier"],
                 "wrong": []
             },
             {
@@ -79,6 +172,7 @@ def initialize_test_data():
                 "type": QuestionType.OPEN,
                 "question": "Quelle civilisation a construit les Pyramides",
                 "correct": "Égyptiens",
+                "aliases": ["Égypte", "Égyptiens anciens"],
                 "wrong": []
             },
             {
@@ -214,6 +308,7 @@ def initialize_test_data():
                 "type": QuestionType.OPEN,
                 "question": "D’après Charles Darwin, quel phénomène permet à chaque espèce de s’adapter à son environnement par une transmission des gènes avantageux ?",
                 "correct": "Sélection naturelle",
+                "aliases": ["La sélection naturelle"],
                 "wrong": []
             },
             {
@@ -385,6 +480,7 @@ def initialize_test_data():
                 "type": QuestionType.OPEN,
                 "question": "Quelle montagne est la plus haute du monde ?",
                 "correct": "Everest",
+                "aliases": ["Mont Everest"],
                 "wrong": []
             },
             {
@@ -873,18 +969,40 @@ def initialize_test_data():
         ]
     }
 
-    for theme_name, questions in test_questions.items():
-        theme_id = theme_ids[theme_name]
-        for q in questions:
-            db.add_question(
-                theme_id=theme_id,
-                question_type=q["type"],
-                question_text=q["question"],
-                correct_answer=q["correct"],
-                wrong_answers=q["wrong"]
-            )
+    # Import en lot : les questions déjà présentes sont ignorées grâce à leur empreinte
+    records = (
+        {"theme": theme_name, **q}
+        for theme_name, questions in test_questions.items()
+        for q in questions
+    )
+    print(f"Questions de test : {import_questions(db, records)}")
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-    db.conn.commit()
+@app.after_request
+def record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, request.method, response.status_code)
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/slow_queries', methods=['GET'])
+def slow_queries():
+    if db.slow_query_log is None:
+        return jsonify({'status': 'error', 'message': 'Journal des requêtes lentes désactivé (QUIZ_SLOW_QUERY_MS)'})
+    return jsonify({
+        'status': 'success',
+        'threshold_ms': db.slow_query_log.threshold * 1000,
+        'statements': db.slow_query_log.top_statements(),
+        'recent': list(db.slow_query_log.recent)
+    })
 
 @app.route('/')
 def home():
@@ -898,7 +1016,10 @@ def login():
     data = request.json
     username = data.get('username')
     password = data.get('password')
-    user_id = db.verify_user(username, password)
+    try:
+        user_id = db.verify_user(username, password)
+    except PasswordHasherBusy:
+        return jsonify({'status': 'error', 'message': 'Serveur occupé, veuillez réessayer'})
     if user_id:
         return jsonify({'status': 'success', 'user_id': user_id})
     return jsonify({'status': 'error', 'message': 'Identifiants invalides'})
@@ -908,7 +1029,11 @@ def register():
     data = request.json
     username = data.get('username')
     password = data.get('password')
-    if db.add_user(username, password):
+    try:
+        created = db.add_user(username, password)
+    except PasswordHasherBusy:
+        return jsonify({'status': 'error', 'message': 'Serveur occupé, veuillez réessayer'})
+    if created:
         return jsonify({'status': 'success'})
     return jsonify({'status': 'error', 'message': 'Nom d\'utilisateur déjà pris'})
 
@@ -917,16 +1042,12 @@ def get_themes():
     themes = db.get_all_themes()
     return jsonify({'status': 'success', 'themes': themes})
 
-@app.route('/api/start_game', methods=['POST'])
-def start_game():
-    data = request.json
-    theme_id = data.get('theme_id')
-    user_id = data.get('user_id')
-    
-    if not theme_id or not user_id:
-        return jsonify({'status': 'error', 'message': 'Données manquantes'})
+def build_deck(theme_id, user_ids=(), rng=random):
+    """Tire et mélange les questions d'une partie ; rng permet un mélange reproductible
 
-    questions = db.get_questions_for_game(theme_id)
+    Les questions déjà vues par l'un des joueurs ne sont tirées qu'en dernier recours.
+    """
+    questions = db.get_questions_for_game(theme_id, user_ids)
     formatted_questions = []
     used_questions = set()
 
@@ -938,82 +1059,279 @@ def start_game():
     if QuestionType.DUAL in questions:
         formatted_questions.extend(add_unique_questions(questions[QuestionType.DUAL], 20, used_questions))
 
+    rng.shuffle(formatted_questions)
+    return formatted_questions
+
+def question_response(fields, **questions):
+    """Réponse JSON qui insère tels quels les payloads de questions déjà encodés"""
+    return Response(json_response_bytes(fields, **questions), mimetype='application/json')
+
+@app.route('/api/start_game', methods=['POST'])
+def start_game():
+    data = request.json
+    theme_id = data.get('theme_id')
+    user_id = data.get('user_id')
+    # Mode préchargement : toutes les questions dans la réponse, réponses via /api/submit_answers
+    prefetch = bool(data.get('prefetch'))
+    
+    if not theme_id or not user_id:
+        return jsonify({'status': 'error', 'message': 'Données manquantes'})
+
+    formatted_questions = build_deck(theme_id, [user_id])
     if not formatted_questions:
         return jsonify({'status': 'error', 'message': 'Pas assez de questions disponibles'})
 
-    random.shuffle(formatted_questions)
-    game_id = f"game_{int(time.time())}_{user_id}"
-    
-    active_games[game_id] = {
-        'questions': formatted_questions,
-        'current_index': 0,
-        'score': 0,
-        'user_id': user_id,
-        'answers_history': [],
-        'start_time': time.time()
+    # La partie ne garde que les identifiants, les questions restent dans la banque partagée
+    game = GameSession([q[0] for q in formatted_questions], user_id, theme_id)
+    fields = {'status': 'success'}
+    if game_tokens is not None:
+        # Mode sans état : la partie voyage dans le jeton, rien n'est gardé par le worker
+        game_id = game_tokens.new_game_id()
+        fields['game_token'] = game_tokens.issue(game_id, game)
+    else:
+        game_id = f"game_{int(time.time())}_{user_id}"
+        active_games.put(game_id, game)
+    fields['game_id'] = game_id
+
+    encoded = {'question': db.get_question_payload(formatted_questions[0][0])}
+    if prefetch:
+        encoded['questions'] = b'[' + b','.join(db.get_question_payload(q[0]) for q in formatted_questions) + b']'
+    return question_response(fields, **encoded)
+
+# Bonus maximal pour une réponse immédiate : +20 % des points de la question
+MAX_TIME_BONUS = 0.2
+# Temps accordé par question, en secondes
+ANSWER_TIME_LIMIT = 30
+
+def parse_time_taken(value):
+    """Temps de réponse envoyé par le client, ramené entre 0 et ANSWER_TIME_LIMIT
+
+    Une valeur absente ou qui n'est pas un nombre compte comme le temps écoulé.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return ANSWER_TIME_LIMIT
+    return max(0, min(value, ANSWER_TIME_LIMIT))
+
+def answer_points(question, answer, time_taken):
+    """Renvoie (réponse juste, points gagnés avec le bonus de rapidité)"""
+    if answer is None:
+        return False, 0
+    is_correct = db.check_answer(question[0], answer)
+    points = question[3] if is_correct else 0
+    if is_correct:
+        time_bonus = max(0, (ANSWER_TIME_LIMIT - time_taken) / ANSWER_TIME_LIMIT * MAX_TIME_BONUS)
+        points = int(points * (1 + time_bonus))
+    return is_correct, points
+
+def score_answer(game, answer, time_taken):
+    """Corrige la réponse à la question courante, l'enregistre dans la partie et renvoie le détail"""
+    current_question = db.get_question(game.current_question_id)
+    is_correct, points = answer_points(current_question, answer, time_taken)
+    game.record_answer(answer, is_correct, points, time_taken)
+    return {
+        'question_id': current_question[0],
+        'is_correct': is_correct,
+        'correct_answer': current_question[5],
+        'points': points,
+        'time_taken': time_taken
     }
 
-    return jsonify({
-        'status': 'success',
-        'game_id': game_id,
-        'question': formatted_questions[0]
-    })
+def game_progress(game):
+    """État de la partie après correction, lu dans la même opération atomique"""
+    return {
+        'next_question_id': None if game.finished else game.current_question_id,
+        'user_id': game.user_id,
+        'theme_id': game.theme_id,
+        'score': game.score,
+        'total_time': game.total_time,
+        'answered': game.current_index,
+        'correct': sum(game.correct)
+    }
+
+def log_answers(mode, game_id, progress, answers, outcomes):
+    """Ajoute les réponses corrigées au journal des réponses, hors du chemin critique"""
+    if answer_log is None:
+        return
+    now = time.time()
+    for answer, outcome in zip(answers, outcomes):
+        answer_log.record({
+            'ts': now,
+            'mode': mode,
+            'game_id': game_id,
+            'user_id': progress['user_id'],
+            'theme_id': progress['theme_id'],
+            'question_id': outcome['question_id'],
+            'answer': answer,
+            'correct': outcome['is_correct'],
+            'points': outcome['points'],
+            'time_taken': outcome['time_taken']
+        })
+
+def finish_if_over(game_id, progress):
+    """Partie terminée : le score part dans la file d'écriture du classement"""
+    if progress['next_question_id'] is None:
+        db.queue_score(progress['user_id'], progress['theme_id'], progress['score'], progress['total_time'],
+                       progress['answered'], progress['correct'])
+        if game_id is not None:
+            active_games.delete(game_id)
+        return True
+    return False
+
+def update_game(data, mutate):
+    """Applique `mutate` à la partie gardée par le serveur, ou à celle du jeton signé
+
+    Renvoie (résultat de mutate, jeton de l'étape suivante ou None, identifiant de la partie).
+    """
+    token = data.get('game_token')
+    if token is None:
+        game_id = data.get('game_id')
+        return active_games.update(game_id, mutate), None, game_id
+    if game_tokens is None:
+        raise InvalidGameToken("Parties sans état désactivées")
+    game_id, game = game_tokens.open(token)
+    if game.finished:
+        return None, None, game_id
+    game_tokens.consume(game_id, game)
+    result = mutate(game)
+    return result, None if game.finished else game_tokens.issue(game_id, game), game_id
 
 @app.route('/api/submit_answer', methods=['POST'])
 def submit_answer():
     data = request.json
-    game_id = data.get('game_id')
+    # Partie gardée par le serveur ; None pour une partie sans état (game_token)
+    game_id = None if data.get('game_token') else data.get('game_id')
     answer = data.get('answer')
-    time_taken = data.get('time_taken', 30)
-    
-    if game_id not in active_games:
+    time_taken = parse_time_taken(data.get('time_taken'))
+
+    def apply_answer(game):
+        # Lecture et mise à jour de l'index et du score en une seule opération atomique
+        if game.finished:
+            return None
+        return score_answer(game, answer, time_taken), game_progress(game)
+
+    try:
+        result, game_token, log_game_id = update_game(data, apply_answer)
+    except KeyError:
         return jsonify({'status': 'error', 'message': 'Partie non trouvée'})
-        
-    game = active_games[game_id]
-    current_question = game['questions'][game['current_index']]
-    
-    if answer is None:
-        points = 0
-        is_correct = False
-    else:
-        is_correct = is_correct_answer(answer, current_question[5])
-        points = current_question[3] if is_correct else 0
-        if is_correct:
-            time_bonus = max(0, (30 - time_taken) / 30 * 0.2)
-            points = int(points * (1 + time_bonus))
-            game['score'] += points
-    
-    game['answers_history'].append({
-        'question': current_question[4],
-        'user_answer': answer,
-        'correct_answer': current_question[5],
-        'is_correct': is_correct,
-        'points': points,
-        'time_taken': time_taken
-    })
-    
-    game['current_index'] += 1
-    next_question = None
-    if game['current_index'] < len(game['questions']):
-        next_question = game['questions'][game['current_index']]
+    except InvalidGameToken as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+    if result is None:
+        return jsonify({'status': 'error', 'message': 'Partie déjà terminée'})
+
+    outcome, progress = result
+    log_answers('solo', log_game_id, progress, [answer], [outcome])
+    game_finished = finish_if_over(game_id, progress)
+    next_question_id = progress['next_question_id']
     
-    return jsonify({
+    return question_response({
         'status': 'success',
-        'is_correct': is_correct,
-        'correct_answer': current_question[5],
-        'points': points,
+        **({'game_token': game_token} if game_token else {}),
+        'is_correct': outcome['is_correct'],
+        'correct_answer': outcome['correct_answer'],
+        'points': outcome['points'],
         'time_taken': time_taken,
-        'next_question': next_question,
-        'game_finished': next_question is None
-    })
+        'game_finished': game_finished
+    }, next_question=None if game_finished else db.get_question_payload(next_question_id))
+
+@app.route('/api/submit_answers', methods=['POST'])
+def submit_answers():
+    """Corrige plusieurs réponses d'un coup, dans l'ordre des questions restantes"""
+    data = request.json
+    game_id = None if data.get('game_token') else data.get('game_id')
+    answers = data.get('answers')
+
+    if not isinstance(answers, list) or not answers:
+        return jsonify({'status': 'error', 'message': 'Données manquantes'})
+
+    def apply_answers(game):
+        if game.finished:
+            return None
+        outcomes = []
+        # Les réponses en trop, au-delà de la dernière question, sont ignorées
+        for entry in answers[:len(game.question_ids) - game.current_index]:
+            if not isinstance(entry, dict):
+                entry = {'answer': entry}
+            outcomes.append(score_answer(game, entry.get('answer'), parse_time_taken(entry.get('time_taken'))))
+        return outcomes, game_progress(game)
+
+    try:
+        result, game_token, log_game_id = update_game(data, apply_answers)
+    except KeyError:
+        return jsonify({'status': 'error', 'message': 'Partie non trouvée'})
+    except InvalidGameToken as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+    if result is None:
+        return jsonify({'status': 'error', 'message': 'Partie déjà terminée'})
+
+    outcomes, progress = result
+    log_answers('solo', log_game_id, progress,
+                [entry.get('answer') if isinstance(entry, dict) else entry for entry in answers], outcomes)
+    game_finished = finish_if_over(game_id, progress)
+    return question_response({
+        'status': 'success',
+        **({'game_token': game_token} if game_token else {}),
+        'results': outcomes,
+        'score': progress['score'],
+        'game_finished': game_finished
+    }, next_question=None if game_finished else db.get_question_payload(progress['next_question_id']))
 
 @app.route('/api/leaderboard', methods=['GET'])
 def get_leaderboard():
     theme_id = request.args.get('theme')
     if theme_id == 'general':
         theme_id = None
-    scores = db.get_leaderboard(theme_id)
-    return jsonify({'status': 'success', 'scores': scores})
+    if 'limit' not in request.args and 'after' not in request.args:
+        scores = db.get_leaderboard(theme_id)
+        return jsonify({'status': 'success', 'scores': scores})
+
+    # Pagination par clé : `after` est le curseur "score:temps:score_id" renvoyé dans `next`
+    limit = max(1, min(request.args.get('limit', 10, type=int), LEADERBOARD_PAGE_MAX))
+    after = None
+    if request.args.get('after'):
+        try:
+            score, total_time, score_id = request.args['after'].split(':')
+            after = (int(score), float(total_time), int(score_id))
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Curseur de pagination invalide'})
+    scores, cursor = db.get_scores_page(theme_id, limit, after)
+    return jsonify({
+        'status': 'success',
+        'scores': scores,
+        'next': ':'.join(map(str, cursor)) if cursor else None
+    })
+
+@app.route('/api/rank', methods=['GET'])
+def get_rank():
+    user_id = request.args.get('user_id')
+    theme_id = request.args.get('theme')
+    if theme_id == 'general':
+        theme_id = None
+    neighbours = max(0, min(request.args.get('neighbours', 5, type=int), LEADERBOARD_PAGE_MAX))
+
+    ranking = db.get_user_rank(user_id, theme_id, neighbours)
+    if ranking is None:
+        return jsonify({'status': 'error', 'message': 'Aucun score pour ce joueur'})
+    return jsonify({'status': 'success', **ranking})
+
+@app.route('/api/profile', methods=['GET'])
+def get_profile():
+    stats = db.get_user_stats(request.args.get('user_id'))
+    if stats is None:
+        return jsonify({'status': 'error', 'message': 'Données manquantes'})
+    return jsonify({'status': 'success', **stats})
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    return jsonify({
+        'status': 'success',
+        'live_games': len(active_games),
+        'live_rooms': len(duel_rooms),
+        'evicted_games': active_games.evictions,
+        'evicted_rooms': duel_rooms.evictions,
+        'password_hashing': db.password_hasher.stats()
+    })
 
 # Helper functions
 def add_unique_questions(question_list, count, used_questions):
@@ -1035,12 +1353,12 @@ def create_duel_room():
     if not theme_id or not user_id:
         return jsonify({'status': 'error', 'message': 'Données manquantes'})
 
-    room_code = str(int(time.time()))[-4:]  # Générer un code unique sur 4 chiffres
-    duel_rooms[room_code] = {
+    room_code = room_registry.create({
         'theme_id': theme_id,
         'players': [{'user_id': user_id, 'is_host': True}],
-        'game_started': False
-    }
+        'game_started': False,
+        'version': 1
+    })
 
     return jsonify({'status': 'success', 'room_code': room_code})
 
@@ -1050,33 +1368,87 @@ def join_duel_room():
     room_code = data.get('room_code')
     user_id = data.get('user_id')
 
-    if room_code not in duel_rooms:
+    try:
+        error = room_registry.join(room_code, user_id)
+    except KeyError:
         return jsonify({'status': 'error', 'message': 'Code de salle invalide'})
 
-    room = duel_rooms[room_code]
-    if room['game_started']:
-        return jsonify({'status': 'error', 'message': 'Le jeu a déjà commencé'})
-
-    if any(player['user_id'] == user_id for player in room['players']):
-        return jsonify({'status': 'error', 'message': 'Utilisateur déjà dans la salle'})
-
-    room['players'].append({'user_id': user_id, 'is_host': False})
+    if error:
+        return jsonify({'status': 'error', 'message': error})
+    lobby_notifier.notify(room_code)
     return jsonify({'status': 'success'})
 
+def lobby_state(room):
+    """État d'un salon tel qu'envoyé aux joueurs"""
+    return {
+        'players': [
+            {'user_id': player['user_id'], 'is_host': player['is_host']}
+            for player in room['players']
+        ],
+        'game_started': room['game_started'],
+        'game_id': room.get('game_id'),
+        'standings': DuelGame(room).standings() if room['game_started'] else [],
+        'version': room['version']
+    }
+
 @app.route('/api/room_players', methods=['GET'])
 def get_room_players():
     room_code = request.args.get('room_code')
+    since = request.args.get('since', type=int)
 
-    if room_code not in duel_rooms:
+    if since is None:
+        room = duel_rooms.get(room_code)
+    else:
+        # Long-poll : on ne répond qu'au prochain changement ou à l'expiration du délai
+        wait = request.args.get('wait', LOBBY_LONG_POLL_MAX, type=float)
+        if wait is None or not math.isfinite(wait):
+            return jsonify({'status': 'error', 'message': 'Délai d\'attente invalide'})
+        wait = max(0, min(wait, LOBBY_LONG_POLL_MAX))
+        room = lobby_notifier.wait_for_change(room_code, since, wait)
+
+    if room is None:
         return jsonify({'status': 'error', 'message': 'Code de salle invalide'})
 
-    room = duel_rooms[room_code]
-    players = [
-        {'user_id': player['user_id'], 'is_host': player['is_host']}
-        for player in room['players']
-    ]
+    return jsonify({'status': 'success', **lobby_state(room)})
+
+@app.route('/api/room_events', methods=['GET'])
+def room_events():
+    room_code = request.args.get('room_code')
+    if duel_rooms.get(room_code) is None:
+        return jsonify({'status': 'error', 'message': 'Code de salle invalide'})
+
+    def events():
+        since = 0
+        while True:
+            room = lobby_notifier.wait_for_change(room_code, since, LOBBY_HEARTBEAT)
+            if room is None:
+                yield 'event: closed\ndata: {}\n\n'
+                return
+            if room['version'] <= since:
+                yield ': keep-alive\n\n'
+                continue
+            last_answer = room.get('last_answer')
+            if since and last_answer and last_answer['version'] == room['version'] == since + 1:
+                # Une seule réponse depuis le dernier envoi : seul le rang du joueur qui a répondu change
+                yield f"event: score\ndata: {json.dumps(last_answer)}\n\n"
+            else:
+                yield f"event: lobby\ndata: {json.dumps(lobby_state(room))}\n\n"
+            since = room['version']
+            # Le flux continue pendant le duel pour suivre les scores, jusqu'à la fin de tous les joueurs
+            if room['game_started'] and DuelGame(room).finished:
+                return
 
-    return jsonify({'status': 'success', 'players': players, 'game_started': room['game_started']})
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def start_error(room, user_id):
+    """Raison pour laquelle ce joueur ne peut pas démarrer le duel, ou None"""
+    host = next((player for player in room['players'] if player['is_host']), None)
+    if not host or host['user_id'] != user_id:
+        return 'Seul l’hôte peut démarrer la partie'
+    if room['game_started']:
+        return 'Le jeu a déjà commencé'
+    return None
 
 @app.route('/api/start_duel', methods=['POST'])
 def start_duel():
@@ -1084,20 +1456,141 @@ def start_duel():
     room_code = data.get('room_code')
     user_id = data.get('user_id')
 
-    if room_code not in duel_rooms:
+    room = duel_rooms.get(room_code)
+    if room is None:
         return jsonify({'status': 'error', 'message': 'Code de salle invalide'})
+    # Vérifiées avant le tirage, qui compte les questions comme utilisées et vues par les joueurs ;
+    # de nouveau dans start() pour le cas où le salon change entre-temps
+    error = start_error(room, user_id)
+    if error:
+        return jsonify({'status': 'error', 'message': error})
 
-    room = duel_rooms[room_code]
-    host = next((player for player in room['players'] if player['is_host']), None)
+    # Un seul tirage pour tout le salon, mélangé avec une graine gardée dans le salon
+    seed = random.getrandbits(32)
+    deck = build_deck(room['theme_id'], [player['user_id'] for player in room['players']], random.Random(seed))
+    if not deck:
+        return jsonify({'status': 'error', 'message': 'Pas assez de questions disponibles'})
+    max_score = sum(int(question[3] * (1 + MAX_TIME_BONUS)) for question in deck)
 
-    if not host or host['user_id'] != user_id:
-        return jsonify({'status': 'error', 'message': 'Seul l’hôte peut démarrer la partie'})
+    def start(room):
+        error = start_error(room, user_id)
+        if error:
+            return None, error
+        DuelGame.start(room, [question[0] for question in deck], max_score, seed)
+        room['game_started'] = True
+        room['game_id'] = f"duel_{room_code}_{int(time.time())}"
+        room['version'] += 1
+        return room['game_id'], None
+
+    try:
+        game_id, error = room_registry.update(room_code, start)
+    except KeyError:
+        return jsonify({'status': 'error', 'message': 'Code de salle invalide'})
 
-    room['game_started'] = True
-    game_id = f"duel_{room_code}_{int(time.time())}"
-    room['game_id'] = game_id
+    if error:
+        return jsonify({'status': 'error', 'message': error})
 
-    return jsonify({'status': 'success', 'game_id': game_id})
+    lobby_notifier.notify(room_code)
+    return question_response({'status': 'success', 'game_id': game_id},
+                             question=db.get_question_payload(deck[0][0]))
+
+@app.route('/api/duel_state', methods=['GET'])
+def duel_state():
+    room_code = request.args.get('room_code')
+    user_id = request.args.get('user_id', type=int)
+
+    room = duel_rooms.get(room_code)
+    if room is None or not room['game_started']:
+        return jsonify({'status': 'error', 'message': 'Aucune partie en cours dans ce salon'})
+    game = DuelGame(room)
+    progress = game.progress(user_id)
+    if progress is None:
+        return jsonify({'status': 'error', 'message': 'Joueur absent du salon'})
+
+    question_id = game.current_question_id(user_id)
+    return question_response({
+        'status': 'success',
+        'score': progress['score'],
+        'rank': game.rank(user_id),
+        'answered': progress['index'],
+        'total_questions': len(room['deck']),
+        'standings': game.standings(),
+        'game_finished': game.finished
+    }, question=None if question_id is None else db.get_question_payload(question_id))
+
+@app.route('/api/duel_answer', methods=['POST'])
+def duel_answer():
+    data = request.json
+    room_code = data.get('room_code')
+    user_id = data.get('user_id')
+    answer = data.get('answer')
+    time_taken = parse_time_taken(data.get('time_taken'))
+
+    def apply_answer(room):
+        if not room['game_started']:
+            return 'Aucune partie en cours dans ce salon'
+        game = DuelGame(room)
+        if game.progress(user_id) is None:
+            return 'Joueur absent du salon'
+        if game.player_finished(user_id):
+            return 'Partie déjà terminée'
+        question = db.get_question(game.current_question_id(user_id))
+        question_id = question[0]
+        is_correct, points = answer_points(question, answer, time_taken)
+        game.record_answer(user_id, is_correct, points, time_taken)
+        room['version'] += 1
+        progress = game.progress(user_id)
+        # Dernière réponse du salon : le flux SSE l'envoie seule, sans recalculer tout le classement
+        room['last_answer'] = {
+            'version': room['version'],
+            'user_id': progress['user_id'],
+            'score': progress['score'],
+            'answered': progress['index'],
+            'rank': game.rank(user_id),
+            'room_finished': game.finished
+        }
+        return {
+            'is_correct': is_correct,
+            'correct_answer': question[5],
+            'points': points,
+            'score': progress['score'],
+            'total_time': progress['time'],
+            'answered': progress['index'],
+            'correct': progress['correct'],
+            'rank': game.rank(user_id),
+            'next_question_id': game.current_question_id(user_id),
+            'theme_id': room['theme_id'],
+            'game_id': room['game_id'],
+            'question_id': question_id,
+            'room_finished': game.finished
+        }
+
+    try:
+        result = room_registry.update(room_code, apply_answer)
+    except KeyError:
+        return jsonify({'status': 'error', 'message': 'Code de salle invalide'})
+
+    if isinstance(result, str):
+        return jsonify({'status': 'error', 'message': result})
+
+    lobby_notifier.notify(room_code)
+    next_question_id = result.pop('next_question_id')
+    theme_id = result.pop('theme_id')
+    correct = result.pop('correct')
+    answered = result.pop('answered')
+    duel_game_id = result.pop('game_id')
+    outcome = {'question_id': result.pop('question_id'), 'is_correct': result['is_correct'],
+               'points': result['points'], 'time_taken': time_taken}
+    log_answers('duel', duel_game_id, {'user_id': user_id, 'theme_id': theme_id}, [answer], [outcome])
+    if next_question_id is None:
+        # Le joueur a terminé : son score rejoint le classement comme une partie solo
+        db.queue_score(user_id, theme_id, result['score'], result['total_time'], answered, correct)
+    return question_response({
+        'status': 'success',
+        **result,
+        'time_taken': time_taken,
+        'game_finished': next_question_id is None
+    }, next_question=None if next_question_id is None else db.get_question_payload(next_question_id))
 
 if __name__ == '__main__':
     # Initialiser les données de test au démarrage
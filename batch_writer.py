@@ -0,0 +1,101 @@
+import queue
+import threading
+import time
+
+from metrics import BATCH_ITEMS_LOST, BATCH_WRITE_ERRORS
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Écrit en arrière-plan, par lots, les éléments mis en file d'attente
+
+    Un lot en erreur est retenté max_retries fois avec un délai doublé à chaque essai, puis
+    confié à `on_failure(lot)`, qui renvoie les éléments qu'il n'a pas pu écrire non plus.
+    """
+
+    def __init__(self, write_batch, batch_size=100, max_queue=10000, interval=1.0,
+                 submit_timeout=0.5, name='batch-writer', max_retries=3, retry_delay=0.2, on_failure=None):
+        self.name = name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.submit_timeout = submit_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._write_batch = write_batch
+        self._on_failure = on_failure
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self):
+        """Nombre d'éléments en attente d'écriture"""
+        return self._queue.qsize()
+
+    def submit(self, item):
+        """Met un élément en file ; renvoie False si la file reste pleine trop longtemps"""
+        if self._closed:
+            return False
+        try:
+            self._queue.put(item, timeout=self.submit_timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def _next_batch(self):
+        """Attend un premier élément puis prend tout ce qui est déjà en file, dans la limite d'un lot"""
+        try:
+            first = self._queue.get(timeout=self.interval)
+        except queue.Empty:
+            return [], False
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if batch:
+                self._write_with_retry(batch)
+
+    def _write_with_retry(self, batch):
+        """Écrit le lot, en le retentant (base verrouillée, par exemple) avant de l'abandonner"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._write_batch(batch)
+                return
+            except Exception as e:
+                BATCH_WRITE_ERRORS.inc(self.name)
+                error = e
+            if attempt < self.max_retries:
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+        if self._on_failure is not None:
+            try:
+                batch = self._on_failure(batch)
+            except Exception as e:
+                error = e
+        if batch:
+            BATCH_ITEMS_LOST.inc(self.name, amount=len(batch))
+            print(f"Erreur lors de l'écriture d'un lot de {len(batch)} éléments ({self.name}), abandonné : {error}")
+
+    def close(self):
+        """Écrit tout ce qui reste en file puis arrête le thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
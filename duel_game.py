@@ -0,0 +1,72 @@
+from ranking import ScoreRanking
+
+
+class DuelGame:
+    """Partie de duel stockée dans le salon : paquet commun, progression et classement des joueurs
+
+    Ne garde aucun état propre, toutes les données restent dans le dict du salon
+    (sérialisable en JSON pour les stockages partagés entre workers).
+    """
+    __slots__ = ('room', 'ranking')
+
+    def __init__(self, room):
+        self.room = room
+        self.ranking = ScoreRanking(room['ranking'])
+
+    @classmethod
+    def start(cls, room, deck, max_score, seed):
+        """Démarre la partie avec le paquet de questions commun à tous les joueurs"""
+        room['deck'] = list(deck)
+        room['seed'] = seed
+        room['progress'] = {
+            str(player['user_id']): {'user_id': player['user_id'], 'index': 0, 'score': 0,
+                                      'correct': 0, 'time': 0.0}
+            for player in room['players']
+        }
+        ranking = ScoreRanking.for_max_score(max_score)
+        for _ in room['progress']:
+            ranking.add(0)
+        room['ranking'] = ranking.counts.tree
+        room['finished_players'] = 0
+        return cls(room)
+
+    def progress(self, user_id):
+        """Progression d'un joueur du salon, ou None"""
+        return self.room['progress'].get(str(user_id))
+
+    def current_question_id(self, user_id):
+        """Question en cours du joueur, ou None s'il a terminé"""
+        index = self.progress(user_id)['index']
+        deck = self.room['deck']
+        return deck[index] if index < len(deck) else None
+
+    def record_answer(self, user_id, is_correct, points, time_taken):
+        """Enregistre la réponse du joueur et met à jour le classement en O(log n)"""
+        progress = self.progress(user_id)
+        self.ranking.move(progress['score'], progress['score'] + points)
+        progress['score'] += points
+        progress['correct'] += 1 if is_correct else 0
+        progress['time'] = round(progress['time'] + time_taken, 2)
+        progress['index'] += 1
+        if progress['index'] >= len(self.room['deck']):
+            self.room['finished_players'] += 1
+
+    def player_finished(self, user_id):
+        return self.progress(user_id)['index'] >= len(self.room['deck'])
+
+    @property
+    def finished(self):
+        return self.room['finished_players'] >= len(self.room['progress'])
+
+    def rank(self, user_id):
+        """Rang actuel du joueur dans le salon"""
+        return self.ranking.rank(self.progress(user_id)['score'])
+
+    def standings(self):
+        """Tableau des scores complet, du premier au dernier"""
+        entries = sorted(self.room['progress'].values(), key=lambda progress: (-progress['score'], progress['time']))
+        return [
+            {'user_id': progress['user_id'], 'score': progress['score'], 'answered': progress['index'],
+             'rank': self.ranking.rank(progress['score'])}
+            for progress in entries
+        ]
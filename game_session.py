@@ -0,0 +1,94 @@
+import time
+from array import array
+
+
+class GameSession:
+    """Partie solo en cours : identifiants de questions et historique en tableaux parallèles"""
+    __slots__ = ('question_ids', 'current_index', 'score', 'user_id', 'theme_id', 'start_time',
+                 'answers', 'correct', 'points', 'times')
+
+    def __init__(self, question_ids, user_id, theme_id, start_time=None):
+        self.question_ids = array('q', question_ids)
+        self.current_index = 0
+        self.score = 0
+        self.user_id = user_id
+        self.theme_id = theme_id
+        self.start_time = time.time() if start_time is None else start_time
+        # Historique des réponses, un élément par question répondue
+        self.answers = []            # réponse du joueur, None si le temps est écoulé
+        self.correct = bytearray()   # 1 si la réponse était juste
+        self.points = array('H')     # points gagnés
+        self.times = array('f')      # temps de réponse en secondes
+
+    @property
+    def finished(self):
+        return self.current_index >= len(self.question_ids)
+
+    @property
+    def current_question_id(self):
+        return self.question_ids[self.current_index]
+
+    @property
+    def total_time(self):
+        return round(sum(self.times), 2)
+
+    def record_answer(self, answer, is_correct, points, time_taken):
+        """Ajoute une réponse à l'historique et passe à la question suivante
+
+        Les valeurs sont converties avant toute écriture : une valeur invalide lève une
+        exception sans laisser les tableaux parallèles de longueurs différentes.
+        """
+        points_entry = array('H', [points])
+        time_entry = array('f', [time_taken])
+        self.answers.append(answer)
+        self.correct.append(1 if is_correct else 0)
+        self.points.extend(points_entry)
+        self.times.extend(time_entry)
+        self.score += points
+        self.current_index += 1
+
+    def to_dict(self):
+        """Forme JSON, pour les stockages partagés entre workers"""
+        return {
+            'question_ids': list(self.question_ids),
+            'current_index': self.current_index,
+            'score': self.score,
+            'user_id': self.user_id,
+            'theme_id': self.theme_id,
+            'start_time': self.start_time,
+            'answers': self.answers,
+            'correct': list(self.correct),
+            'points': list(self.points),
+            'times': list(self.times)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Reconstruit une partie à partir de to_dict()"""
+        session = cls(data['question_ids'], data['user_id'], data['theme_id'], data['start_time'])
+        session.current_index = data['current_index']
+        session.score = data['score']
+        session.answers = data['answers']
+        session.correct = bytearray(data['correct'])
+        session.points = array('H', data['points'])
+        session.times = array('f', data['times'])
+        return session
+
+    def to_compact(self):
+        """Forme la plus courte possible, pour les jetons signés : sans le texte des réponses"""
+        return [self.user_id, self.theme_id, round(self.start_time, 3), self.current_index, self.score,
+                list(self.question_ids), self.correct.hex(), list(self.points),
+                [round(t, 2) for t in self.times]]
+
+    @classmethod
+    def from_compact(cls, data):
+        """Reconstruit une partie à partir de to_compact() ; l'historique des réponses est vide"""
+        user_id, theme_id, start_time, current_index, score, question_ids, correct, points, times = data
+        session = cls(question_ids, user_id, theme_id, start_time)
+        session.current_index = current_index
+        session.score = score
+        session.answers = [None] * current_index
+        session.correct = bytearray.fromhex(correct)
+        session.points = array('H', points)
+        session.times = array('f', times)
+        return session
@@ -0,0 +1,298 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from quiz_database import ConnectionPool
+
+
+class MemoryGameStore:
+    """Parties et salons gardés dans la mémoire du processus courant, par ordre d'utilisation
+
+    update() n'exécute `mutate` que sous l'un des `stripes` verrous de clé : le verrou global
+    ne protège que le dictionnaire, jamais le code appelant (qui peut lire la base).
+    """
+
+    def __init__(self, namespace, ttl=None, max_entries=None, stripes=64):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._items = OrderedDict()  # clé -> [version, état, dernier accès], du plus ancien au plus récent
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def keys(self):
+        """Clés de toutes les entrées, lues en une fois"""
+        with self._lock:
+            return list(self._items)
+
+    def _touch(self, key, item):
+        item[2] = time.monotonic()
+        self._items.move_to_end(key)
+
+    def _evict_overflow(self):
+        """Évince les entrées les moins récemment utilisées au-delà de max_entries"""
+        if self.max_entries is None:
+            return
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """Renvoie l'état associé à la clé, ou None"""
+        return self.get_versioned(key)[1]
+
+    def get_versioned(self, key):
+        """Renvoie (version, état), ou (None, None) si la clé est inconnue"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None, None
+            self._touch(key, item)
+            return item[0], item[1]
+
+    def create(self, key, state):
+        """Ajoute une entrée ; renvoie False si la clé existe déjà"""
+        with self._lock:
+            if key in self._items:
+                return False
+            self._items[key] = [1, state, time.monotonic()]
+            self._evict_overflow()
+            return True
+
+    def put(self, key, state):
+        """Ajoute ou remplace une entrée"""
+        with self._lock:
+            item = self._items.get(key)
+            self._items[key] = [item[0] + 1 if item else 1, state, time.monotonic()]
+            self._items.move_to_end(key)
+            self._evict_overflow()
+
+    def compare_and_set(self, key, version, state):
+        """Remplace l'état seulement si la version n'a pas changé depuis la lecture"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != version:
+                return False
+            item[0] += 1
+            item[1] = state
+            self._touch(key, item)
+            return True
+
+    def update(self, key, mutate):
+        """Applique `mutate` à l'état de façon atomique et renvoie son résultat"""
+        with self._stripes[hash(key) % len(self._stripes)]:
+            with self._lock:
+                item = self._items.get(key)
+                if item is None:
+                    raise KeyError(key)
+                self._touch(key, item)
+            result = mutate(item[1])
+            with self._lock:
+                item[0] += 1
+                if self._items.get(key) is item:
+                    self._touch(key, item)
+            return result
+
+    def delete(self, key):
+        """Supprime une entrée si elle existe"""
+        with self._lock:
+            self._items.pop(key, None)
+
+    def reap(self):
+        """Supprime les entrées inactives depuis plus de `ttl` secondes et renvoie leur nombre"""
+        if self.ttl is None:
+            return 0
+        deadline = time.monotonic() - self.ttl
+        reaped = 0
+        with self._lock:
+            # Les entrées sont rangées par dernier accès : on s'arrête à la première encore active
+            while self._items:
+                key, item = next(iter(self._items.items()))
+                if item[2] >= deadline:
+                    break
+                del self._items[key]
+                reaped += 1
+            self.evictions += reaped
+        return reaped
+
+
+class SQLiteGameStore:
+    """Parties et salons partagés entre les workers via une table SQLite"""
+
+    MAX_RETRIES = 50
+
+    def __init__(self, namespace, db_name='game_state.db', ttl=None, max_entries=None,
+                 encode=None, decode=None, pool_size=5, busy_timeout=5.0):
+        self.namespace = namespace
+        # Conversion des états vers et depuis une forme sérialisable en JSON
+        self.encode = encode or (lambda state: state)
+        self.decode = decode or (lambda data: data)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.pool = ConnectionPool(db_name, size=pool_size, busy_timeout=busy_timeout)
+        with self.pool.connection() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS game_state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            ''')
+            conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_game_state_updated
+            ON game_state (namespace, updated_at)
+            ''')
+            conn.commit()
+
+    def __contains__(self, key):
+        return self.get_versioned(key)[0] is not None
+
+    def __len__(self):
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM game_state WHERE namespace = ?",
+                                (self.namespace,)).fetchone()[0]
+
+    def keys(self):
+        """Clés de toutes les entrées, lues en une seule requête"""
+        with self.pool.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT key FROM game_state WHERE namespace = ?",
+                                                   (self.namespace,))]
+
+    def get(self, key):
+        """Renvoie l'état associé à la clé, ou None"""
+        return self.get_versioned(key)[1]
+
+    def get_versioned(self, key):
+        """Renvoie (version, état), ou (None, None) si la clé est inconnue"""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT version, state FROM game_state WHERE namespace = ? AND key = ?",
+                               (self.namespace, key)).fetchone()
+        if row is None:
+            return None, None
+        return row[0], self.decode(json.loads(row[1]))
+
+    def create(self, key, state):
+        """Ajoute une entrée ; renvoie False si la clé existe déjà"""
+        try:
+            with self.pool.connection() as conn:
+                conn.execute('''
+                INSERT INTO game_state (namespace, key, version, state, updated_at)
+                VALUES (?, ?, 1, ?, ?)
+                ''', (self.namespace, key, json.dumps(self.encode(state)), time.time()))
+                conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def put(self, key, state):
+        """Ajoute ou remplace une entrée"""
+        with self.pool.connection() as conn:
+            conn.execute('''
+            INSERT INTO game_state (namespace, key, version, state, updated_at)
+            VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT (namespace, key) DO UPDATE
+            SET version = version + 1, state = excluded.state, updated_at = excluded.updated_at
+            ''', (self.namespace, key, json.dumps(self.encode(state)), time.time()))
+            conn.commit()
+
+    def compare_and_set(self, key, version, state):
+        """Remplace l'état seulement si la version n'a pas changé depuis la lecture"""
+        with self.pool.connection() as conn:
+            cursor = conn.execute('''
+            UPDATE game_state
+            SET version = version + 1, state = ?, updated_at = ?
+            WHERE namespace = ? AND key = ? AND version = ?
+            ''', (json.dumps(self.encode(state)), time.time(), self.namespace, key, version))
+            conn.commit()
+        return cursor.rowcount == 1
+
+    def update(self, key, mutate):
+        """Applique `mutate` à l'état et réessaie tant qu'un autre worker l'a modifié entre-temps"""
+        for _ in range(self.MAX_RETRIES):
+            version, state = self.get_versioned(key)
+            if version is None:
+                raise KeyError(key)
+            result = mutate(state)
+            if self.compare_and_set(key, version, state):
+                return result
+        raise RuntimeError(f"Trop de modifications concurrentes pour {self.namespace}/{key}")
+
+    def delete(self, key):
+        """Supprime une entrée si elle existe"""
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM game_state WHERE namespace = ? AND key = ?", (self.namespace, key))
+            conn.commit()
+
+    def reap(self):
+        """Supprime les entrées inactives et les plus anciennes au-delà de max_entries"""
+        reaped = 0
+        with self.pool.connection() as conn:
+            if self.ttl is not None:
+                reaped += conn.execute(
+                    "DELETE FROM game_state WHERE namespace = ? AND updated_at < ?",
+                    (self.namespace, time.time() - self.ttl)).rowcount
+            if self.max_entries is not None:
+                reaped += conn.execute('''
+                DELETE FROM game_state
+                WHERE namespace = ? AND key IN (
+                    SELECT key FROM game_state
+                    WHERE namespace = ?
+                    ORDER BY updated_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+                ''', (self.namespace, self.namespace, self.max_entries)).rowcount
+            conn.commit()
+        self.evictions += reaped
+        return reaped
+
+
+class SessionReaper:
+    """Thread qui purge périodiquement les parties et salons abandonnés"""
+
+    def __init__(self, stores, interval=60.0):
+        self.stores = stores
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='session-reaper', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            for store in self.stores:
+                try:
+                    store.reap()
+                except Exception as e:
+                    print(f"Erreur lors de la purge de {store.namespace}: {e}")
+
+    def close(self):
+        """Arrête le thread de purge"""
+        self._stopped.set()
+        self._thread.join()
+
+
+def create_game_store(namespace, ttl=None, max_entries=None, encode=None, decode=None):
+    """Choisit le stockage selon QUIZ_GAME_STORE : 'memory' (par défaut) ou 'sqlite'
+
+    encode et decode ne servent qu'au stockage SQLite, qui conserve les états en JSON.
+    """
+    backend = os.environ.get('QUIZ_GAME_STORE', 'memory')
+    if backend == 'memory':
+        return MemoryGameStore(namespace, ttl=ttl, max_entries=max_entries)
+    if backend == 'sqlite':
+        return SQLiteGameStore(namespace, db_name=os.environ.get('QUIZ_GAME_STORE_PATH', 'game_state.db'),
+                               ttl=ttl, max_entries=max_entries, encode=encode, decode=decode)
+    raise ValueError(f"Stockage de parties inconnu : {backend}")
@@ -0,0 +1,84 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from game_session import GameSession
+
+
+class InvalidGameToken(Exception):
+    """Jeton de partie falsifié, expiré ou déjà utilisé"""
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+class GameTokenSigner:
+    """Parties solo sans état serveur : la partie voyage dans un jeton signé par HMAC-SHA256
+
+    Chaque jeton ne sert qu'une fois : `used_tokens` garde, pour chaque partie, l'indice de la
+    dernière étape jouée et ne l'avance que d'une étape à la fois, par compare_and_set. Ce stockage
+    doit être partagé par tous les workers et ses entrées doivent vivre au moins max_age.
+    """
+
+    VERSION = 1
+    MAC_SIZE = 16
+
+    def __init__(self, secret, used_tokens, max_age=1800):
+        self._key = hashlib.sha256(secret.encode() if isinstance(secret, str) else secret).digest()
+        self.used_tokens = used_tokens
+        self.max_age = max_age
+
+    @staticmethod
+    def new_game_id():
+        """Identifiant de partie aléatoire, impossible à deviner"""
+        return _b64encode(os.urandom(12))
+
+    def _mac(self, payload):
+        return hmac.new(self._key, payload, hashlib.sha256).digest()[:self.MAC_SIZE]
+
+    def issue(self, game_id, session):
+        """Renvoie le jeton représentant l'état courant de la partie"""
+        payload = json.dumps([self.VERSION, game_id, int(time.time()), session.to_compact()],
+                             separators=(',', ':')).encode()
+        return f"{_b64encode(payload)}.{_b64encode(self._mac(payload))}"
+
+    def open(self, token):
+        """Vérifie le jeton et renvoie (game_id, session) ; lève InvalidGameToken sinon"""
+        try:
+            encoded_payload, encoded_mac = token.split('.')
+            payload = _b64decode(encoded_payload)
+            mac = _b64decode(encoded_mac)
+        except (AttributeError, ValueError):
+            raise InvalidGameToken("Jeton de partie illisible")
+        if not hmac.compare_digest(mac, self._mac(payload)):
+            raise InvalidGameToken("Jeton de partie invalide")
+
+        version, game_id, issued_at, compact = json.loads(payload)
+        if version != self.VERSION:
+            raise InvalidGameToken("Version de jeton inconnue")
+        if time.time() - issued_at > self.max_age:
+            raise InvalidGameToken("Jeton de partie expiré")
+        return game_id, GameSession.from_compact(compact)
+
+    def consume(self, game_id, session):
+        """Marque l'étape courante de la partie comme jouée ; lève InvalidGameToken si elle l'était déjà"""
+        index = session.current_index
+        version, last_played = self.used_tokens.get_versioned(game_id)
+        if version is None:
+            # Seule la première étape peut ouvrir la fenêtre : une partie entamée dont on a perdu
+            # la trace (entrée expirée ou évincée) est refusée plutôt que rejouable
+            if index > 0:
+                raise InvalidGameToken("Partie inconnue ou expirée")
+            if not self.used_tokens.create(game_id, index):
+                raise InvalidGameToken("Jeton de partie déjà utilisé")
+            return
+        if last_played != index - 1 or not self.used_tokens.compare_and_set(game_id, version, index):
+            raise InvalidGameToken("Jeton de partie déjà utilisé")
@@ -0,0 +1,74 @@
+import bisect
+import threading
+
+from ranking import ScoreRanking
+
+
+class TopScores:
+    """Meilleurs scores gardés en mémoire, par thème et toutes catégories confondues"""
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self._themes = {}   # theme_id -> [(clé de tri, ligne du classement)]
+        self._global = []
+        self._lock = threading.Lock()
+
+    def _insert(self, entries, entry):
+        """Insère une entrée à sa place et ne garde que les `capacity` premières"""
+        if len(entries) >= self.capacity and entry[0] >= entries[-1][0]:
+            return
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position][0] == entry[0]:
+            return  # Score déjà connu
+        entries.insert(position, entry)
+        if len(entries) > self.capacity:
+            entries.pop()
+
+    def add(self, score_id, theme_id, username, theme_name, score, total_time):
+        """Ajoute un score enregistré en base"""
+        # Même ordre que SQL : score décroissant puis temps croissant
+        key = (-score, total_time, score_id)
+        with self._lock:
+            self._insert(self._themes.setdefault(theme_id, []), (key, (username, score, total_time)))
+            self._insert(self._global, (key, (username, theme_name, score, total_time)))
+
+    def top(self, theme_id=None, limit=10):
+        """Renvoie les `limit` meilleurs scores sous la même forme que get_top_scores"""
+        with self._lock:
+            entries = self._global if theme_id is None else self._themes.get(theme_id, [])
+            return [row for _, row in entries[:limit]]
+
+
+class ScoreRanks:
+    """Nombre de scores enregistrés par valeur de score, par thème et tous thèmes confondus
+
+    Sert à compter en O(log n) les scores strictement meilleurs qu'un score donné,
+    sans parcourir la table scores.
+    """
+
+    INITIAL_MAX_SCORE = 255
+
+    def __init__(self):
+        self._themes = {}  # theme_id -> ScoreRanking
+        self._global = ScoreRanking.for_max_score(self.INITIAL_MAX_SCORE)
+        self._lock = threading.Lock()
+
+    def add(self, theme_id, score, count=1):
+        """Compte `count` scores de valeur `score` dans le thème"""
+        score = max(0, score)
+        with self._lock:
+            theme = self._themes.get(theme_id)
+            if theme is None:
+                theme = self._themes[theme_id] = ScoreRanking.for_max_score(self.INITIAL_MAX_SCORE)
+            for ranking in (theme, self._global):
+                ranking.ensure_score(score)
+                ranking.add(score, count)
+
+    def scores_above(self, theme_id, score):
+        """Nombre de scores strictement supérieurs à `score` (theme_id None : tous thèmes)"""
+        with self._lock:
+            ranking = self._global if theme_id is None else self._themes.get(theme_id)
+            if ranking is None:
+                return 0
+            ranking.ensure_score(max(0, score))
+            return ranking.players_above(max(0, score))
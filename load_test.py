@@ -0,0 +1,259 @@
+"""Simulation de joueurs concurrents de bout en bout.
+
+Exemples :
+    python load_test.py --players 50 --concurrency 10 --output resultats.json
+    python load_test.py --url http://127.0.0.1:8000 --players 200 --duel-rooms 20
+    python load_test.py --players 50 --compare resultats.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TestClientTransport:
+    """Appelle l'application Flask en mémoire, sans réseau"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, payload=None):
+        response = self.client.open(path, method=method, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    """Appelle un serveur lancé à part (par exemple gunicorn)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+class LatencyRecorder:
+    """Latences et erreurs par route"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def call(self, transport, method, path, payload=None):
+        route = path.split('?')[0]
+        started = time.perf_counter()
+        try:
+            status, body = transport.request(method, path, payload)
+        except Exception:
+            status, body = None, None
+        elapsed = time.perf_counter() - started
+        failed = status is None or status >= 400 or not body or body.get('status') != 'success'
+        with self._lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+            if failed:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return None if failed else body
+
+    def report(self, wall_time):
+        routes = {}
+        total = 0
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            total += len(samples)
+            errors = self.errors.get(route, 0)
+            routes[route] = {
+                'count': len(samples),
+                'errors': errors,
+                'error_rate': errors / len(samples),
+                'p50_ms': percentile(samples, 50) * 1000,
+                'p95_ms': percentile(samples, 95) * 1000,
+                'p99_ms': percentile(samples, 99) * 1000,
+            }
+        return {
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'wall_time_s': wall_time,
+            'throughput_rps': total / wall_time if wall_time else 0.0,
+            'routes': routes,
+        }
+
+
+def percentile(sorted_samples, pct):
+    """Percentile par rang le plus proche"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[rank]
+
+
+def pick_answer(question):
+    """Choisit une des propositions au hasard, ou une réponse quelconque aux questions ouvertes"""
+    if not question['options']:
+        return 'je ne sais pas'
+    return random.choice(question['options'])
+
+
+def run_player(transport, recorder, index, theme_ids, run_id, prefetch=False):
+    """Inscription, connexion, partie complète puis classement"""
+    username = f"charge_{run_id}_{index}"
+    recorder.call(transport, 'POST', '/api/register', {'username': username, 'password': 'motdepasse'})
+    body = recorder.call(transport, 'POST', '/api/login', {'username': username, 'password': 'motdepasse'})
+    if not body:
+        return
+    user_id = body['user_id']
+    theme_id = random.choice(theme_ids)
+
+    body = recorder.call(transport, 'POST', '/api/start_game',
+                         {'theme_id': theme_id, 'user_id': user_id, 'prefetch': prefetch})
+    if not body:
+        return
+    game_id = body['game_id']
+    game_token = body.get('game_token')  # serveur en mode sans état
+    if prefetch:
+        # Toutes les réponses en une seule requête, en fin de partie
+        recorder.call(transport, 'POST', '/api/submit_answers', {
+            'game_id': game_id,
+            'game_token': game_token,
+            'answers': [{'answer': pick_answer(question), 'time_taken': random.randint(1, 29)}
+                        for question in body['questions']]
+        })
+    question = None if prefetch else body['question']
+    while question is not None:
+        body = recorder.call(transport, 'POST', '/api/submit_answer', {
+            'game_id': game_id,
+            'game_token': game_token,
+            'answer': pick_answer(question),
+            'time_taken': random.randint(1, 29)
+        })
+        if not body:
+            return
+        question = body['next_question']
+        game_token = body.get('game_token')
+
+    recorder.call(transport, 'GET', f'/api/leaderboard?theme={theme_id}')
+    recorder.call(transport, 'GET', '/api/leaderboard?theme=general')
+
+
+def run_duel_room(transport, recorder, index, theme_ids, run_id, players_per_room):
+    """Un hôte crée un salon, les autres le rejoignent, puis l'hôte lance la partie"""
+    user_ids = []
+    for seat in range(players_per_room):
+        username = f"duel_{run_id}_{index}_{seat}"
+        recorder.call(transport, 'POST', '/api/register', {'username': username, 'password': 'motdepasse'})
+        body = recorder.call(transport, 'POST', '/api/login', {'username': username, 'password': 'motdepasse'})
+        if not body:
+            return
+        user_ids.append(body['user_id'])
+
+    body = recorder.call(transport, 'POST', '/api/create_duel_room',
+                         {'theme_id': random.choice(theme_ids), 'user_id': user_ids[0]})
+    if not body:
+        return
+    room_code = body['room_code']
+    for user_id in user_ids[1:]:
+        recorder.call(transport, 'POST', '/api/join_duel_room', {'room_code': room_code, 'user_id': user_id})
+        recorder.call(transport, 'GET', f'/api/room_players?room_code={room_code}')
+    recorder.call(transport, 'POST', '/api/start_duel', {'room_code': room_code, 'user_id': user_ids[0]})
+
+
+def compare(report, baseline, tolerance):
+    """Affiche l'évolution du p95 par route ; renvoie False si une route régresse au-delà de la tolérance"""
+    ok = True
+    for route, stats in report['routes'].items():
+        previous = baseline['routes'].get(route)
+        if not previous or not previous['p95_ms']:
+            continue
+        change = (stats['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+        regression = change > tolerance
+        ok = ok and not regression
+        print(f"{route:28} p95 {previous['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f} ms "
+              f"({change:+.1f}%){'  REGRESSION' if regression else ''}")
+    return ok
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de l'API du quiz")
+    parser.add_argument('--url', help="URL d'un serveur lancé à part ; par défaut, client de test Flask")
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duel-rooms', type=int, default=5)
+    parser.add_argument('--players-per-room', type=int, default=3)
+    parser.add_argument('--output', help="Fichier JSON où enregistrer les résultats")
+    parser.add_argument('--compare', help="Résultats JSON d'une exécution précédente")
+    parser.add_argument('--tolerance', type=float, default=20.0,
+                        help="Hausse du p95 tolérée en %% avant de signaler une régression")
+    parser.add_argument('--prefetch', action='store_true',
+                        help="Parties solo préchargées, réponses envoyées en un seul lot")
+    args = parser.parse_args()
+
+    if args.url:
+        transport_factory = lambda: HttpTransport(args.url)
+    else:
+        # Base temporaire pour ne pas polluer quiz.db
+        scratch = tempfile.mkdtemp()
+        os.environ.setdefault('QUIZ_DB_PATH', os.path.join(scratch, 'load_test.db'))
+        os.environ.setdefault('QUIZ_ANSWER_LOG_DIR', os.path.join(scratch, 'answer_log'))
+        import app as quiz_app
+        quiz_app.initialize_test_data()
+        transport_factory = lambda: TestClientTransport(quiz_app.app)
+
+    themes = transport_factory().request('GET', '/api/themes')[1]
+    theme_ids = [theme_id for theme_id, _ in themes['themes']]
+    run_id = f"{int(time.time())}_{random.randint(0, 9999)}"
+    recorder = LatencyRecorder()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        tasks = [executor.submit(run_player, transport_factory(), recorder, i, theme_ids, run_id, args.prefetch)
+                 for i in range(args.players)]
+        tasks += [executor.submit(run_duel_room, transport_factory(), recorder, i, theme_ids, run_id,
+                                  args.players_per_room)
+                  for i in range(args.duel_rooms)]
+        for task in tasks:
+            task.result()
+    report = recorder.report(time.perf_counter() - started)
+    report['run'] = {'commit': git_commit(), 'target': args.url or 'test_client', 'players': args.players,
+                     'concurrency': args.concurrency, 'duel_rooms': args.duel_rooms, 'prefetch': args.prefetch,
+                     'timestamp': time.time()}
+
+    print(f"{report['requests']} requêtes en {report['wall_time_s']:.2f}s "
+          f"({report['throughput_rps']:.1f} req/s), {report['errors']} erreurs")
+    for route, stats in report['routes'].items():
+        print(f"{route:28} n={stats['count']:5}  p50 {stats['p50_ms']:7.2f}  p95 {stats['p95_ms']:7.2f}  "
+              f"p99 {stats['p99_ms']:7.2f} ms  erreurs {stats['error_rate']:.1%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(report, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import math
+import threading
+import time
+
+
+class LobbyNotifier:
+    """Réveille les clients en attente d'un changement dans un salon de duel
+
+    Une condition par salon, créée au premier client en attente et retirée au départ du
+    dernier : un changement ne réveille que les clients du salon concerné.
+    """
+
+    def __init__(self, rooms, poll_interval=1.0):
+        self.rooms = rooms
+        # Relecture périodique pour voir les changements faits par les autres workers
+        self.poll_interval = poll_interval
+        self._conditions = {}  # code du salon -> [condition, nombre de clients en attente]
+        self._lock = threading.Lock()
+
+    def notify(self, room_code):
+        """Signale que le salon a changé"""
+        with self._lock:
+            entry = self._conditions.get(room_code)
+        if entry is not None:
+            with entry[0]:
+                entry[0].notify_all()
+
+    def wait_for_change(self, room_code, since, timeout):
+        """Attend que la version du salon dépasse `since` ; renvoie le salon, ou None s'il n'existe plus"""
+        if not math.isfinite(timeout) or timeout <= 0:
+            # Délai nul ou invalide (nan, inf) : simple lecture, sans attente
+            return self.rooms.get(room_code)
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            entry = self._conditions.setdefault(room_code, [threading.Condition(), 0])
+            entry[1] += 1
+        try:
+            while True:
+                room = self.rooms.get(room_code)
+                if room is None or room['version'] > since:
+                    return room
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return room
+                with entry[0]:
+                    entry[0].wait(min(remaining, self.poll_interval))
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._conditions[room_code]
@@ -0,0 +1,171 @@
+import bisect
+import functools
+import re
+import threading
+import time
+
+# Bornes des histogrammes de latence, en secondes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"'.replace('\n', ' ') for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Compteur monotone, par combinaison de labels"""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Gauge:
+    """Valeur calculée au moment de la lecture ; kind='counter' pour un total tenu ailleurs"""
+
+    def __init__(self, name, documentation, read, kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self._read = read
+
+    def render(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}',
+                f'{self.name} {self._read()}']
+
+
+class Histogram:
+    """Histogramme cumulatif à bornes fixes, par combinaison de labels"""
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [compte par borne..., somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series_items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for label_values, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.labels + ('le',), label_values + (le,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {series[-2]}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+class Registry:
+    """Ensemble des métriques exposées sur /api/metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Format texte de Prometheus"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'quiz_http_request_duration_seconds', "Durée des requêtes HTTP", ('route', 'method', 'status')))
+DB_METHOD_SECONDS = REGISTRY.register(Histogram(
+    'quiz_db_method_duration_seconds', "Durée des méthodes de QuizDatabase", ('method',)))
+SQL_SECONDS = REGISTRY.register(Histogram(
+    'quiz_sql_statement_duration_seconds', "Durée d'exécution des requêtes SQL", ('statement',)))
+SQL_ERRORS = REGISTRY.register(Counter(
+    'quiz_sql_errors_total', "Requêtes SQL en erreur", ('statement',)))
+BATCH_WRITE_ERRORS = REGISTRY.register(Counter(
+    'quiz_batch_write_errors_total', "Écritures de lots en erreur, nouvelles tentatives comprises", ('writer',)))
+BATCH_ITEMS_LOST = REGISTRY.register(Counter(
+    'quiz_batch_items_lost_total', "Éléments abandonnés après l'échec de toutes les tentatives", ('writer',)))
+
+
+def timed(histogram, label):
+    """Décorateur qui mesure la durée d'une fonction dans `histogram`"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, label)
+        return wrapper
+    return decorator
+
+
+def time_methods(histogram, prefix=''):
+    """Décorateur de classe qui mesure chacune de ses méthodes"""
+    def decorator(cls):
+        for name, attribute in list(vars(cls).items()):
+            if callable(attribute) and not name.startswith('__'):
+                setattr(cls, name, timed(histogram, prefix + name)(attribute))
+        return cls
+    return decorator
+
+
+_STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|TABLE(?:\s+IF\s+NOT\s+EXISTS)?)\s+(\w+)', re.IGNORECASE)
+_statement_labels = {}
+
+
+def statement_label(sql):
+    """Étiquette courte et stable pour une requête : verbe et table principale"""
+    label = _statement_labels.get(sql)
+    if label is None:
+        words = sql.split()
+        verb = words[0].upper() if words else ''
+        if verb == 'UPDATE' and len(words) > 1:
+            label = f'UPDATE {words[1]}'
+        else:
+            match = _STATEMENT_TABLE.search(sql)
+            label = f'{verb} {match.group(1)}' if match else ' '.join(words[:2]).upper()
+        if len(_statement_labels) < 1000:
+            _statement_labels[sql] = label
+    return label
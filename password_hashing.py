@@ -0,0 +1,91 @@
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class PasswordHasherBusy(Exception):
+    """Trop de hachages en attente : la requête doit être refusée plutôt que mise en file"""
+
+
+def _scrypt(password, salt, n, r, p):
+    # Exécuté dans un processus du pool
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * 1024 * 1024).hex()
+
+
+def _is_legacy_hash(stored_hash):
+    """Anciens comptes : SHA-256 hexadécimal sans sel"""
+    return len(stored_hash) == 64 and '$' not in stored_hash
+
+
+class PasswordHasher:
+    """Hachage scrypt des mots de passe dans un pool de processus borné"""
+
+    def __init__(self, workers=2, max_pending=4, wait_timeout=2.0, n=2 ** 14, r=8, p=1):
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self.n, self.r, self.p = n, r, p
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        # Métriques
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _pool(self):
+        # Créé au premier usage, donc dans le worker gunicorn et non dans le processus maître.
+        # Pas de fork : le worker a déjà des threads, dont les verrous seraient copiés tels quels
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    def _run(self, password, salt, n, r, p):
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy()
+        with self._lock:
+            self.pending += 1
+        try:
+            return self._pool().submit(_scrypt, password, salt, n, r, p).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+            self._slots.release()
+
+    def hash(self, password):
+        """Renvoie 'scrypt$n$r$p$sel$empreinte'"""
+        salt = os.urandom(16)
+        digest = self._run(password, salt, self.n, self.r, self.p)
+        return f"scrypt${self.n}${self.r}${self.p}${salt.hex()}${digest}"
+
+    def verify(self, password, stored_hash):
+        """Renvoie (mot de passe correct, empreinte à recalculer avec les paramètres actuels)"""
+        if _is_legacy_hash(stored_hash):
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(legacy, stored_hash), True
+
+        try:
+            _, n, r, p, salt, digest = stored_hash.split('$')
+            n, r, p = int(n), int(r), int(p)
+        except ValueError:
+            return False, False
+        computed = self._run(password, bytes.fromhex(salt), n, r, p)
+        ok = hmac.compare_digest(computed, digest)
+        return ok, ok and (n, r, p) != (self.n, self.r, self.p)
+
+    def stats(self):
+        """Profondeur de file et compteurs du pool de hachage"""
+        return {'pending': self.pending, 'completed': self.completed, 'rejected': self.rejected}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
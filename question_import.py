@@ -0,0 +1,115 @@
+import argparse
+import csv
+import itertools
+import json
+import time
+
+from quiz_database import QuestionType, QuizDatabase, question_row
+
+
+class ImportReport:
+    """Compteurs d'un import de questions"""
+
+    def __init__(self):
+        self.inserted = 0
+        self.skipped = 0   # doublons déjà présents en base ou dans le fichier
+        self.invalid = 0   # lignes incomplètes ou de type inconnu
+        self.started_at = time.perf_counter()
+        self.elapsed = 0.0
+
+    def rate(self, count):
+        return count / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.inserted} insérées ({self.rate(self.inserted):.0f}/s), "
+                f"{self.skipped} ignorées ({self.rate(self.skipped):.0f}/s), "
+                f"{self.invalid} invalides en {self.elapsed:.2f}s")
+
+
+def parse_question_type(value):
+    """Accepte un QuestionType, son nom ('OPEN') ou sa valeur (5)"""
+    if isinstance(value, QuestionType):
+        return value
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        return QuestionType(int(value))
+    return QuestionType[str(value).strip().upper()]
+
+
+def read_jsonl(path):
+    """Lit un fichier JSONL : {"theme", "type", "question", "correct", "wrong": [...], "aliases": [...]} par ligne"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_csv(path):
+    """Lit un CSV avec les colonnes theme, type, question, correct, wrong1, wrong2, wrong3
+    et, en option, aliases (séparés par des |)"""
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            row['wrong'] = [row.pop(column, None) or None for column in ('wrong1', 'wrong2', 'wrong3')]
+            row['aliases'] = [alias for alias in (row.pop('aliases', None) or '').split('|') if alias]
+            yield row
+
+
+def read_questions(path):
+    """Choisit le lecteur selon l'extension du fichier"""
+    if path.endswith('.csv'):
+        return read_csv(path)
+    return read_jsonl(path)
+
+
+def import_questions(db, records, batch_size=5000):
+    """Insère les questions par lots, sans doublons, et renvoie un ImportReport"""
+    report = ImportReport()
+    theme_ids = {}
+    touched_themes = set()
+    batch_aliases = []  # (alias, content_hash) des questions du lot en cours
+
+    def rows():
+        for record in records:
+            try:
+                theme_name = record['theme']
+                if theme_name not in theme_ids:
+                    theme_ids[theme_name] = db.add_theme(theme_name)
+                row = question_row(theme_ids[theme_name], parse_question_type(record['type']),
+                                   record['question'], record['correct'], record.get('wrong'))
+            except (KeyError, ValueError, TypeError, AttributeError):
+                report.invalid += 1
+                continue
+            touched_themes.add(row[0])
+            batch_aliases.extend((alias, row[-1]) for alias in record.get('aliases') or ())
+            yield row
+
+    pending = rows()
+    while True:
+        batch = list(itertools.islice(pending, batch_size))
+        if not batch:
+            break
+        inserted = db.insert_question_rows(batch, batch_aliases)
+        batch_aliases.clear()
+        report.inserted += inserted
+        report.skipped += len(batch) - inserted
+
+    for theme_id in touched_themes:
+        db.question_bank.invalidate(theme_id)
+    report.elapsed = time.perf_counter() - report.started_at
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Importe des questions depuis des fichiers JSONL ou CSV",
+        epilog="Sur une base en service, les workers voient les nouvelles questions "
+               "au plus QUIZ_QUESTION_REFRESH secondes après l'import, sans redémarrage.")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--db', default='quiz.db')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    database = QuizDatabase(args.db)
+    for path in args.files:
+        print(f"{path}: {import_questions(database, read_questions(path), args.batch_size)}")
+    database.close()
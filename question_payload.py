@@ -0,0 +1,35 @@
+import json
+import random
+
+
+def question_payload(row):
+    """Question vue par le client : ni bonne réponse, ni compteurs d'utilisation
+
+    Les propositions sont mélangées une fois pour toutes, la bonne réponse
+    n'est donc pas toujours la première.
+    """
+    wrong_answers = [answer for answer in row[6:9] if answer]
+    # Sans mauvaise réponse, c'est une question ouverte : aucune proposition à afficher
+    options = [row[5], *wrong_answers] if wrong_answers else []
+    random.shuffle(options)
+    return {'id': row[0], 'text': row[4], 'type': row[2], 'points': row[3], 'options': options}
+
+
+def encode_question(row):
+    """Payload JSON compact d'une question, prêt à être inséré dans une réponse"""
+    return json.dumps(question_payload(row), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response_bytes(fields, **encoded):
+    """Assemble un objet JSON à partir de champs ordinaires et de valeurs déjà encodées
+
+    `encoded` associe un nom de champ à des octets JSON (ou None pour null).
+    """
+    body = json.dumps(fields, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    parts = [body[:-1]]
+    for name, value in encoded.items():
+        if len(parts) > 1 or fields:
+            parts.append(b',')
+        parts.append(json.dumps(name).encode('utf-8') + b':' + (value if value is not None else b'null'))
+    parts.append(b'}')
+    return b''.join(parts)
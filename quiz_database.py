@@ -1,197 +1,1380 @@
 import sqlite3
 import hashlib
+import itertools
+import logging
+import queue
+import re
+import random
+import threading
 import time
+from collections import deque
+from contextlib import contextmanager
 from enum import Enum
 
+from answer_matching import AnswerMatcher
+from batch_writer import BatchWriter
+from leaderboard import ScoreRanks, TopScores
+from metrics import DB_METHOD_SECONDS, SQL_ERRORS, SQL_SECONDS, statement_label, time_methods
+from password_hashing import PasswordHasher, PasswordHasherBusy
+from question_payload import encode_question
+from seen_questions import QuestionBitset, SeenQuestions
+
 class QuestionType(Enum):
     DUAL = 1      # Questions à 2 choix (1 point)
     QUAD = 3      # Questions à 4 choix (3 points)
     OPEN = 5      # Questions sans proposition (5 points)
 
+slow_query_logger = logging.getLogger('quiz.slow_queries')
+
+# Chaînes et nombres littéraux, remplacés par ? pour regrouper les requêtes par forme
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+# Nombre de questions tirées par type pour une partie
+QUESTIONS_PER_GAME = {
+    QuestionType.OPEN: 5,
+    QuestionType.QUAD: 10,
+    QuestionType.DUAL: 20
+}
+
+
+def question_hash(theme_id, question_type_value, question_text, correct_answer, wrong_answers):
+    """Empreinte du contenu d'une question, pour détecter les doublons à l'import"""
+    parts = [str(theme_id), str(question_type_value), question_text.strip(), correct_answer.strip()]
+    parts.extend((answer or '').strip() for answer in wrong_answers)
+    return hashlib.blake2b('\x1f'.join(parts).encode(), digest_size=16).hexdigest()
+
+
+def question_row(theme_id, question_type, question_text, correct_answer, wrong_answers=None):
+    """Ligne prête pour SQL_INSERT_QUESTION"""
+    wrong_answers = list(wrong_answers or [])[:3]
+    wrong_answers += [None] * (3 - len(wrong_answers))
+    return (theme_id, question_type.value, question_type.value, question_text, correct_answer,
+            *wrong_answers,
+            question_hash(theme_id, question_type.value, question_text, correct_answer, wrong_answers))
+
+
+def _theme_key(theme_id):
+    """Normalise un identifiant de thème reçu en JSON (entier ou chaîne)"""
+    try:
+        return int(theme_id)
+    except (TypeError, ValueError):
+        return None
+
+
+# Les identifiants de joueurs arrivent sous les mêmes formes
+_user_key = _theme_key
+
+
+class SlowQueryLog:
+    """Journal des requêtes lentes et temps cumulé par forme de requête"""
+
+    EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+    def __init__(self, threshold, max_entries=100):
+        self.threshold = threshold
+        self.recent = deque(maxlen=max_entries)
+        self._shapes = {}  # requête normalisée -> [nombre, temps total, temps max, nombre de lentes]
+        self._normalized = {}
+        self._lock = threading.Lock()
+
+    def normalize(self, sql):
+        """Forme de la requête : espaces réduits, littéraux remplacés par ?"""
+        shape = self._normalized.get(sql)
+        if shape is None:
+            shape = _SQL_LITERAL.sub('?', ' '.join(sql.split()))
+            if len(self._normalized) < 1000:
+                self._normalized[sql] = shape
+        return shape
+
+    def record(self, conn, sql, parameters, elapsed):
+        """Cumule le temps de la requête et journalise son plan si elle dépasse le seuil"""
+        shape = self.normalize(sql)
+        slow = elapsed >= self.threshold
+        with self._lock:
+            stats = self._shapes.setdefault(shape, [0, 0.0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            stats[3] += slow
+        if not slow:
+            return
+
+        plan = []
+        if shape.split(' ', 1)[0].upper() in self.EXPLAINABLE:
+            try:
+                # Appel direct à sqlite3 pour ne pas mesurer ni journaliser l'EXPLAIN lui-même
+                plan = [row[3] for row in sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parameters)]
+            except sqlite3.Error as e:
+                plan = [f"EXPLAIN impossible : {e}"]
+        # Seuls les types des valeurs liées sont gardés : elles peuvent contenir des noms
+        # d'utilisateur ou des empreintes de mots de passe, et le journal est lisible par tous
+        entry = {
+            'statement': shape,
+            'parameter_types': [type(value).__name__ for value in parameters],
+            'duration_ms': round(elapsed * 1000, 3),
+            'plan': plan,
+            'at': time.time()
+        }
+        self.recent.append(entry)
+        slow_query_logger.warning("Requête lente (%.1f ms) : %s %s | plan : %s",
+                                  entry['duration_ms'], shape, entry['parameter_types'], ' | '.join(plan))
+
+    def top_statements(self, limit=20):
+        """Formes de requêtes qui consomment le plus de temps de base"""
+        with self._lock:
+            items = sorted(self._shapes.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [
+            {'statement': shape, 'count': count, 'total_ms': round(total * 1000, 3),
+             'max_ms': round(worst * 1000, 3), 'slow_count': slow_count}
+            for shape, (count, total, worst, slow_count) in items
+        ]
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connexion qui mesure la durée de chaque requête SQL"""
+
+    slow_query_log = None
+
+    def _observe(self, sql, parameters, started, failed):
+        elapsed = time.perf_counter() - started
+        label = statement_label(sql)
+        SQL_SECONDS.observe(elapsed, label)
+        if failed:
+            SQL_ERRORS.inc(label)
+        elif self.slow_query_log is not None:
+            self.slow_query_log.record(self, sql, parameters, elapsed)
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(sql, parameters)
+            failed = False
+            return result
+        finally:
+            self._observe(sql, parameters, started, failed)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+            failed = False
+            return result
+        finally:
+            # Le plan d'un lot est celui de sa première ligne
+            first = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else ()
+            self._observe(sql, first, started, failed)
+
+
+class ConnectionPool:
+    """Pool borné de connexions SQLite partagées entre les threads"""
+
+    def __init__(self, db_name, size=5, busy_timeout=5.0, slow_query_log=None):
+        self.db_name = db_name
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.slow_query_log = slow_query_log
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Ouvre une connexion en mode WAL pour que les lectures ne bloquent pas les écritures"""
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout, check_same_thread=False,
+                               factory=InstrumentedConnection)
+        conn.slow_query_log = self.slow_query_log
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        return conn
+
+    def acquire(self):
+        """Emprunte une connexion libre, en ouvre une nouvelle ou attend qu'une se libère"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.busy_timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Aucune connexion disponible dans le pool")
+
+    def release(self, conn):
+        """Rend une connexion au pool en annulant toute transaction restée ouverte"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Fournit une connexion le temps d'un bloc `with`"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Ferme toutes les connexions inactives du pool"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+class _QuestionPool:
+    """Questions d'un couple (thème, type) rangées par nombre d'utilisations"""
+    __slots__ = ('rows', 'usage', 'buckets', 'lock')
+
+    def __init__(self, rows):
+        # rows contient les colonnes de la table questions, used_count et last_used compris
+        self.rows = {}
+        self.usage = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+        # Mélange puis tri stable : les ex-aequo restent dans un ordre aléatoire
+        rows = list(rows)
+        random.shuffle(rows)
+        rows.sort(key=lambda row: (row[9] or 0, row[10] or ''))
+        for row in rows:
+            question_id = row[0]
+            used_count = row[9] or 0
+            self.rows[question_id] = tuple(row[:9])
+            self.usage[question_id] = (used_count, row[10])
+            self.buckets.setdefault(used_count, {})[question_id] = None
+
+    def select(self, limit, current_time, seen=None):
+        """Tire les questions les moins utilisées puis les marque comme utilisées
+
+        Avec `seen` (QuestionBitset), les questions déjà vues par le joueur ne
+        sont prises qu'à défaut d'en avoir assez de nouvelles.
+        """
+        with self.lock:
+            selected = []
+            if not seen:
+                for used_count in sorted(self.buckets):
+                    need = limit - len(selected)
+                    if need <= 0:
+                        break
+                    selected.extend(itertools.islice(self.buckets[used_count], need))
+            else:
+                already_seen = []
+                for used_count in sorted(self.buckets):
+                    for question_id in self.buckets[used_count]:
+                        if question_id not in seen:
+                            selected.append(question_id)
+                            if len(selected) >= limit:
+                                break
+                        elif len(already_seen) < limit:
+                            already_seen.append(question_id)
+                    if len(selected) >= limit:
+                        break
+                selected.extend(already_seen[:limit - len(selected)])
+
+            for question_id in selected:
+                used_count = self.usage[question_id][0]
+                bucket = self.buckets[used_count]
+                del bucket[question_id]
+                if not bucket:
+                    del self.buckets[used_count]
+                self.usage[question_id] = (used_count + 1, current_time)
+                self.buckets.setdefault(used_count + 1, {})[question_id] = None
+
+            return [self.rows[question_id] for question_id in selected]
+
+
+class QuestionBank:
+    """Cache en mémoire des questions, par couple (theme_id, QuestionType)
+
+    Les autres processus (workers, import en ligne de commande) incrémentent la version du
+    thème qu'ils modifient : au plus toutes les `refresh_interval` secondes, une lecture de
+    ces versions suffit pour oublier les pools devenus obsolètes.
+    """
+
+    def __init__(self, loader, answer_loader, version_loader, refresh_interval=5.0):
+        self._loader = loader
+        self._answer_loader = answer_loader
+        self._version_loader = version_loader
+        self.refresh_interval = refresh_interval
+        self._versions = None     # theme_id -> content_version lue à la dernière vérification
+        self._checked_at = None
+        self._refresh_lock = threading.Lock()
+        self._pools = {}
+        self._by_id = {}     # question_id -> ligne, partagée avec les pools
+        self._matchers = {}  # question_id -> AnswerMatcher
+        self._payloads = {}  # question_id -> JSON compact envoyé au client
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Oublie les thèmes modifiés par un autre processus depuis la dernière vérification"""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return
+        # Une seule vérification à la fois : les autres threads gardent le cache actuel
+        if not self._refresh_lock.acquire(blocking=force):
+            return
+        try:
+            self._checked_at = now
+            versions = dict(self._version_loader())
+            previous, self._versions = self._versions, versions
+            if previous is None:
+                return
+            for theme_id, version in versions.items():
+                if previous.get(theme_id) != version:
+                    self.invalidate(theme_id)
+        finally:
+            self._refresh_lock.release()
+
+    def pool(self, theme_id, q_type):
+        """Renvoie le pool de questions, chargé depuis la base au premier accès"""
+        self.refresh()
+        key = (theme_id, q_type)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = _QuestionPool(self._loader(theme_id, q_type))
+                    self._build_matchers(pool, *self._answer_loader(theme_id, q_type))
+                    self._pools[key] = pool
+                    self._by_id.update(pool.rows)
+        return pool
+
+    def _build_matchers(self, pool, aliases, tolerance):
+        """Normalise une fois les réponses acceptées de chaque question du pool"""
+        for question_id, row in pool.rows.items():
+            # Les questions à choix reçoivent le texte exact d'une proposition : pas de tolérance
+            self._matchers[question_id] = AnswerMatcher(
+                row[5], aliases.get(question_id, ()),
+                tolerance if row[2] == QuestionType.OPEN.value else 0)
+
+    def matcher(self, question_id):
+        """Renvoie les réponses acceptées d'une question déjà chargée, ou None"""
+        self.refresh()
+        return self._matchers.get(question_id)
+
+    def remember_matcher(self, question_id, matcher):
+        self._matchers[question_id] = matcher
+
+    def get(self, question_id):
+        """Renvoie la ligne d'une question déjà chargée, ou None"""
+        return self._by_id.get(question_id)
+
+    def remember(self, row):
+        """Garde une question chargée hors des pools (par exemple par un autre worker)"""
+        self._by_id[row[0]] = row
+        self._payloads.pop(row[0], None)
+
+    def payload(self, question_id):
+        """Renvoie le JSON client d'une question déjà chargée, encodé au premier appel, ou None"""
+        encoded = self._payloads.get(question_id)
+        if encoded is None:
+            row = self._by_id.get(question_id)
+            if row is None:
+                return None
+            encoded = self._payloads[question_id] = encode_question(row)
+        return encoded
+
+    def invalidate(self, theme_id=None, q_type=None):
+        """Oublie les pools concernés, ils seront rechargés au prochain tirage"""
+        with self._lock:
+            if theme_id is None:
+                self._pools.clear()
+                self._matchers.clear()
+                self._payloads.clear()
+                return
+            for key in list(self._pools):
+                if key[0] == theme_id and (q_type is None or key[1] == q_type):
+                    for question_id in self._pools.pop(key).rows:
+                        self._matchers.pop(question_id, None)
+                        self._payloads.pop(question_id, None)
+
+
+class UsageTracker:
+    """Tampon d'écriture différée pour les compteurs d'utilisation des questions"""
+
+    def __init__(self, flush_callback, interval=5.0, max_pending=500):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._flush_callback = flush_callback
+        self._pending = {}  # question_id -> [incrément, dernier last_used]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='usage-tracker', daemon=True)
+        self._thread.start()
+
+    def record(self, question_ids, current_time):
+        """Comptabilise une utilisation pour chaque question, sans toucher à la base"""
+        with self._lock:
+            for question_id in question_ids:
+                entry = self._pending.get(question_id)
+                if entry is None:
+                    self._pending[question_id] = [1, current_time]
+                else:
+                    entry[0] += 1
+                    entry[1] = current_time
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Écrit tous les compteurs accumulés en une seule transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                self._flush_callback(batch)
+            except Exception as e:
+                print(f"Erreur lors de l'écriture des compteurs d'utilisation: {e}")
+                # Réintègre le lot pour la prochaine tentative
+                with self._lock:
+                    for question_id, (count, last_used) in batch.items():
+                        entry = self._pending.setdefault(question_id, [0, last_used])
+                        entry[0] += count
+                        entry[1] = max(entry[1], last_used)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Arrête le thread d'écriture et vide le tampon"""
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+
+
+def _migration_initial_tables(conn):
+    """Tables initiales : utilisateurs, thèmes, questions et scores"""
+    # Table des utilisateurs
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Table des thèmes
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS themes (
+        theme_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        theme_name TEXT UNIQUE NOT NULL
+    )
+    ''')
+
+    # Table des questions
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS questions (
+        question_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        theme_id INTEGER,
+        question_type INTEGER NOT NULL,
+        points INTEGER NOT NULL,
+        question_text TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        wrong_answer1 TEXT,
+        wrong_answer2 TEXT,
+        wrong_answer3 TEXT,
+        used_count INTEGER DEFAULT 0,
+        last_used TIMESTAMP,
+        FOREIGN KEY (theme_id) REFERENCES themes (theme_id)
+    )
+    ''')
+
+    # Table des scores
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS scores (
+        score_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        theme_id INTEGER,
+        score INTEGER NOT NULL,
+        total_time FLOAT NOT NULL,
+        played_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        FOREIGN KEY (theme_id) REFERENCES themes (theme_id)
+    )
+    ''')
+
+
+def _migration_hot_query_indexes(conn):
+    """Index couvrants pour le tirage des questions et les classements"""
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_questions_theme_type_usage
+    ON questions (theme_id, question_type, used_count, last_used)
+    ''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_scores_theme_rank
+    ON scores (theme_id, score DESC, total_time, user_id)
+    ''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_scores_rank
+    ON scores (score DESC, total_time, user_id, theme_id)
+    ''')
+
+
+def _migration_question_content_hash(conn):
+    """Empreinte unique par question : supprime les doublons insérés à chaque démarrage"""
+    conn.execute("ALTER TABLE questions ADD COLUMN content_hash TEXT")
+    seen = set()
+    duplicates = []
+    hashes = []
+    for row in conn.execute('''
+        SELECT question_id, theme_id, question_type, question_text, correct_answer,
+               wrong_answer1, wrong_answer2, wrong_answer3
+        FROM questions
+        ORDER BY question_id
+    ''').fetchall():
+        content_hash = question_hash(row[1], row[2], row[3], row[4], row[5:8])
+        if content_hash in seen:
+            duplicates.append((row[0],))
+        else:
+            seen.add(content_hash)
+            hashes.append((content_hash, row[0]))
+    conn.executemany("DELETE FROM questions WHERE question_id = ?", duplicates)
+    conn.executemany("UPDATE questions SET content_hash = ? WHERE question_id = ?", hashes)
+    conn.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_content_hash
+    ON questions (content_hash)
+    ''')
+
+
+def _migration_answer_aliases(conn):
+    """Réponses alternatives par question et tolérance aux fautes par thème"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS question_aliases (
+        question_id INTEGER NOT NULL,
+        alias TEXT NOT NULL,
+        PRIMARY KEY (question_id, alias),
+        FOREIGN KEY (question_id) REFERENCES questions (question_id)
+    )
+    ''')
+    # Une faute par mot au plus par défaut ; un thème peut l'augmenter (set_answer_tolerance) ou la couper (0)
+    conn.execute("ALTER TABLE themes ADD COLUMN answer_tolerance INTEGER NOT NULL DEFAULT 1")
+
+
+def _migration_user_seen_questions(conn):
+    """Questions déjà vues par chaque joueur, en bitmap indexée par question_id"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_seen_questions (
+        user_id INTEGER PRIMARY KEY,
+        seen BLOB NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''')
+
+
+def _migration_score_seek_indexes(conn):
+    """Index pour la pagination par clé (score, temps, score_id) et le meilleur score d'un joueur
+
+    Ils remplacent les index de classement de la migration 2, qui servaient les mêmes tris :
+    chaque insertion de score n'entretient plus que trois index.
+    """
+    # score_id, alias du rowid, termine implicitement chaque index : l'ordre complet est couvert
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_scores_theme_seek
+    ON scores (theme_id, score DESC, total_time)
+    ''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_scores_seek
+    ON scores (score DESC, total_time)
+    ''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_scores_user_best
+    ON scores (user_id, score DESC, total_time)
+    ''')
+    conn.execute("DROP INDEX IF EXISTS idx_scores_theme_rank")
+    conn.execute("DROP INDEX IF EXISTS idx_scores_rank")
+
+
+def _migration_user_stats(conn):
+    """Statistiques cumulées par joueur et par thème, reprises des scores existants"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER NOT NULL,
+        theme_id INTEGER NOT NULL,
+        games_played INTEGER NOT NULL DEFAULT 0,
+        total_score INTEGER NOT NULL DEFAULT 0,
+        best_score INTEGER NOT NULL DEFAULT 0,
+        best_time FLOAT,
+        questions_answered INTEGER NOT NULL DEFAULT 0,
+        correct_answers INTEGER NOT NULL DEFAULT 0,
+        total_time FLOAT NOT NULL DEFAULT 0,
+        answered_time FLOAT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, theme_id),
+        FOREIGN KEY (user_id) REFERENCES users (user_id),
+        FOREIGN KEY (theme_id) REFERENCES themes (theme_id)
+    )
+    ''')
+    # Les parties déjà jouées n'ont pas gardé le détail des réponses : précision inconnue, et leur
+    # temps reste hors de answered_time, le temps des seules parties comptées dans questions_answered
+    conn.execute('''
+    INSERT OR IGNORE INTO user_stats (user_id, theme_id, games_played, total_score, best_score, best_time, total_time)
+    SELECT user_id, theme_id, COUNT(*), SUM(score), MAX(score),
+           (SELECT MIN(s.total_time) FROM scores s
+            WHERE s.user_id = scores.user_id AND s.theme_id = scores.theme_id AND s.score = MAX(scores.score)),
+           SUM(total_time)
+    FROM scores
+    WHERE user_id IS NOT NULL AND theme_id IS NOT NULL
+    GROUP BY user_id, theme_id
+    ''')
+
+
+def _migration_theme_content_version(conn):
+    """Version du contenu de chaque thème, incrémentée à chaque ajout ou modification de question"""
+    conn.execute("ALTER TABLE themes ADD COLUMN content_version INTEGER NOT NULL DEFAULT 0")
+
+
+# Migrations du schéma, appliquées dans l'ordre ; la version courante est
+# enregistrée dans PRAGMA user_version
+MIGRATIONS = [
+    (1, _migration_initial_tables),
+    (2, _migration_hot_query_indexes),
+    (3, _migration_question_content_hash),
+    (4, _migration_answer_aliases),
+    (5, _migration_user_seen_questions),
+    (6, _migration_score_seek_indexes),
+    (7, _migration_user_stats),
+    (8, _migration_theme_content_version),
+]
+
+SQL_INSERT_QUESTION = '''
+INSERT OR IGNORE INTO questions (
+    theme_id, question_type, points, question_text,
+    correct_answer, wrong_answer1, wrong_answer2, wrong_answer3, content_hash
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Signale aux autres workers que les questions du thème ont changé (voir QuestionBank.refresh)
+SQL_BUMP_THEME_VERSION = "UPDATE themes SET content_version = content_version + 1 WHERE theme_id = ?"
+SQL_BUMP_QUESTION_THEME_VERSION = '''
+UPDATE themes SET content_version = content_version + 1
+WHERE theme_id = (SELECT theme_id FROM questions WHERE question_id = ?)
+'''
+
+# Alias rattaché à une question par son empreinte, utilisable sans connaître son identifiant
+SQL_INSERT_ALIAS_BY_HASH = '''
+INSERT OR IGNORE INTO question_aliases (question_id, alias)
+SELECT question_id, ? FROM questions WHERE content_hash = ?
+'''
+
+# Requêtes chaudes et index qu'elles doivent utiliser (voir check_query_plans)
+SQL_LOAD_QUESTIONS = '''
+SELECT question_id, theme_id, question_type, points, question_text,
+       correct_answer, wrong_answer1, wrong_answer2, wrong_answer3,
+       used_count, last_used
+FROM questions
+WHERE theme_id = ? AND question_type = ?
+'''
+
+SQL_TOP_SCORES_THEME = '''
+SELECT users.username, scores.score, scores.total_time
+FROM scores
+JOIN users ON scores.user_id = users.user_id
+WHERE scores.theme_id = ?
+ORDER BY scores.score DESC, scores.total_time ASC
+LIMIT ?
+'''
+
+SQL_TOP_SCORES_GLOBAL = '''
+SELECT users.username, themes.theme_name, scores.score, scores.total_time
+FROM scores
+JOIN users ON scores.user_id = users.user_id
+JOIN themes ON scores.theme_id = themes.theme_id
+ORDER BY scores.score DESC, scores.total_time ASC
+LIMIT ?
+'''
+
+SQL_TOP_SCORES_SEED_THEME = '''
+SELECT scores.score_id, scores.theme_id, users.username, themes.theme_name,
+       scores.score, scores.total_time
+FROM scores
+JOIN users ON scores.user_id = users.user_id
+JOIN themes ON scores.theme_id = themes.theme_id
+WHERE scores.theme_id = ?
+ORDER BY scores.score DESC, scores.total_time ASC
+LIMIT ?
+'''
+
+SQL_TOP_SCORES_SEED_GLOBAL = '''
+SELECT scores.score_id, scores.theme_id, users.username, themes.theme_name,
+       scores.score, scores.total_time
+FROM scores
+JOIN users ON scores.user_id = users.user_id
+JOIN themes ON scores.theme_id = themes.theme_id
+ORDER BY scores.score DESC, scores.total_time ASC
+LIMIT ?
+'''
+
+SQL_SCORES_SINCE = '''
+SELECT scores.score_id, scores.theme_id, users.username, themes.theme_name,
+       scores.score, scores.total_time
+FROM scores
+JOIN users ON scores.user_id = users.user_id
+JOIN themes ON scores.theme_id = themes.theme_id
+WHERE scores.score_id > ?
+ORDER BY scores.score_id
+'''
+
+SQL_SCORE_COUNTS = '''
+SELECT scores.theme_id, scores.score, COUNT(*)
+FROM scores
+JOIN users ON scores.user_id = users.user_id
+JOIN themes ON scores.theme_id = themes.theme_id
+WHERE scores.score_id <= ?
+GROUP BY scores.theme_id, scores.score
+'''
+
+
+def _seek_sql(by_theme, where, order='', columns=None):
+    """Parcours du classement dans l'ordre (score DESC, total_time, score_id), filtré par thème ou non"""
+    columns = columns or 'scores.score_id, users.username, themes.theme_name, scores.score, scores.total_time'
+    theme_filter = 'scores.theme_id = ? AND ' if by_theme else ''
+    return f'''
+SELECT {columns}
+FROM scores
+JOIN users ON scores.user_id = users.user_id
+JOIN themes ON scores.theme_id = themes.theme_id
+WHERE {theme_filter}{where}
+{order}
+'''
+
+
+_DOWN = 'ORDER BY scores.score DESC, scores.total_time ASC, scores.score_id ASC LIMIT ?'
+_UP = 'ORDER BY scores.score ASC, scores.total_time DESC, scores.score_id DESC LIMIT ?'
+_TIES_AFTER = 'scores.score = ? AND scores.total_time >= ? AND (scores.total_time > ? OR scores.score_id > ?)'
+_TIES_BEFORE = 'scores.score = ? AND scores.total_time <= ? AND (scores.total_time < ? OR scores.score_id < ?)'
+
+# Pagination par clé, indexées par « filtré par thème » : chaque page se lit en deux
+# recherches d'index, la fin des ex æquo du curseur puis les scores inférieurs
+SQL_SCORES_FIRST = {t: _seek_sql(t, '1', _DOWN) for t in (True, False)}
+SQL_SCORES_TIES_AFTER = {t: _seek_sql(t, _TIES_AFTER, _DOWN) for t in (True, False)}
+SQL_SCORES_BELOW = {t: _seek_sql(t, 'scores.score < ?', _DOWN) for t in (True, False)}
+SQL_SCORES_TIES_BEFORE = {t: _seek_sql(t, _TIES_BEFORE, _UP) for t in (True, False)}
+SQL_SCORES_ABOVE = {t: _seek_sql(t, 'scores.score > ?', _UP) for t in (True, False)}
+SQL_COUNT_TIES_BEFORE = {t: _seek_sql(t, _TIES_BEFORE, columns='COUNT(*)') for t in (True, False)}
+
+SQL_USER_BEST_SCORE = {
+    t: f'''
+SELECT score, total_time, score_id
+FROM scores
+WHERE user_id = ?{' AND theme_id = ?' if t else ''}
+ORDER BY score DESC, total_time ASC, score_id ASC
+LIMIT 1
+''' for t in (True, False)
+}
+
+def _stats_row(user_id, theme_id, score, total_time, answered=0, correct=0):
+    """Paramètres de SQL_ROLLUP_USER_STATS pour une partie terminée"""
+    return (user_id, theme_id, score, score, total_time, answered, correct, total_time,
+            total_time if answered else 0.0)
+
+
+def _with_ratios(stats):
+    """Ajoute précision, temps moyen par réponse et score moyen aux compteurs cumulés"""
+    answered = stats['questions_answered']
+    stats['accuracy'] = round(stats['correct_answers'] / answered, 3) if answered else None
+    stats['average_answer_time'] = round(stats['answered_time'] / answered, 2) if answered else None
+    stats['average_score'] = round(stats['total_score'] / stats['games_played'], 2) if stats['games_played'] else None
+    return stats
+
+
+def _ranked_row(row, by_theme):
+    """Ligne de classement sous la même forme que get_top_scores"""
+    _, username, theme_name, score, total_time = row
+    return (username, score, total_time) if by_theme else (username, theme_name, score, total_time)
+
+
+SQL_INSERT_SCORE = '''
+INSERT INTO scores (user_id, theme_id, score, total_time)
+VALUES (?, ?, ?, ?)
+'''
+
+# Cumul des statistiques d'un joueur à la fin d'une partie ; dans le SET, les colonnes
+# non préfixées valent encore leur ancienne valeur
+SQL_ROLLUP_USER_STATS = '''
+INSERT INTO user_stats (user_id, theme_id, games_played, total_score, best_score, best_time,
+                        questions_answered, correct_answers, total_time, answered_time)
+VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, theme_id) DO UPDATE SET
+    games_played = games_played + 1,
+    total_score = total_score + excluded.total_score,
+    best_score = MAX(best_score, excluded.best_score),
+    best_time = CASE
+        WHEN excluded.best_score > best_score THEN excluded.best_time
+        WHEN excluded.best_score = best_score THEN MIN(COALESCE(best_time, excluded.best_time), excluded.best_time)
+        ELSE best_time
+    END,
+    questions_answered = questions_answered + excluded.questions_answered,
+    correct_answers = correct_answers + excluded.correct_answers,
+    total_time = total_time + excluded.total_time,
+    answered_time = answered_time + excluded.answered_time
+'''
+
+SQL_USER_STATS = '''
+SELECT user_stats.theme_id, themes.theme_name, games_played, total_score, best_score, best_time,
+       questions_answered, correct_answers, user_stats.total_time, answered_time
+FROM user_stats
+JOIN themes ON user_stats.theme_id = themes.theme_id
+WHERE user_stats.user_id = ?
+'''
+
+HOT_QUERIES = [
+    (SQL_LOAD_QUESTIONS, (1, QuestionType.DUAL.value), 'idx_questions_theme_type_usage'),
+    (SQL_TOP_SCORES_THEME, (1, 10), 'idx_scores_theme_seek'),
+    (SQL_TOP_SCORES_GLOBAL, (10,), 'idx_scores_seek'),
+    (SQL_TOP_SCORES_SEED_THEME, (1, 100), 'idx_scores_theme_seek'),
+    (SQL_TOP_SCORES_SEED_GLOBAL, (100,), 'idx_scores_seek'),
+    (SQL_SCORES_TIES_AFTER[True], (1, 10, 30.0, 30.0, 1, 20), 'idx_scores_theme_seek'),
+    (SQL_SCORES_BELOW[False], (10, 20), 'idx_scores_seek'),
+    (SQL_SCORES_ABOVE[True], (1, 10, 20), 'idx_scores_theme_seek'),
+    (SQL_USER_BEST_SCORE[False], (1,), 'idx_scores_user_best'),
+]
+
+
+@time_methods(DB_METHOD_SECONDS)
 class QuizDatabase:
-    def __init__(self, db_name='quiz.db'):
-        """Initialise la connexion à la base de données"""
-        self.conn = sqlite3.connect(db_name, check_same_thread=False)  # Permet l'accès multi-thread
-        self.cursor = self.conn.cursor()
-        self.create_tables()
-
-    def create_tables(self):
-        """Création des tables de la base de données"""
-        # Table des utilisateurs
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-
-        # Table des thèmes
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS themes (
-            theme_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            theme_name TEXT UNIQUE NOT NULL
-        )
-        ''')
-
-        # Table des questions
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS questions (
-            question_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            theme_id INTEGER,
-            question_type INTEGER NOT NULL,
-            points INTEGER NOT NULL,
-            question_text TEXT NOT NULL,
-            correct_answer TEXT NOT NULL,
-            wrong_answer1 TEXT,
-            wrong_answer2 TEXT,
-            wrong_answer3 TEXT,
-            used_count INTEGER DEFAULT 0,
-            last_used TIMESTAMP,
-            FOREIGN KEY (theme_id) REFERENCES themes (theme_id)
-        )
-        ''')
-
-        # Table des scores
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scores (
-            score_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            theme_id INTEGER,
-            score INTEGER NOT NULL,
-            total_time FLOAT NOT NULL,
-            played_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id),
-            FOREIGN KEY (theme_id) REFERENCES themes (theme_id)
-        )
-        ''')
-
-        self.conn.commit()
+    def __init__(self, db_name='quiz.db', pool_size=5, busy_timeout=5.0,
+                 usage_flush_interval=5.0, usage_flush_size=500,
+                 leaderboard_size=100, leaderboard_refresh=1.0,
+                 score_batch_size=100, score_queue_size=10000, password_hasher=None,
+                 slow_query_threshold=None, seen_cache_size=10000, question_refresh=5.0):
+        """Initialise le pool de connexions à la base de données
+
+        slow_query_threshold (en secondes) active le journal des requêtes lentes.
+        question_refresh : délai maximal, en secondes, avant de voir les questions ajoutées par un autre processus.
+        """
+        self.db_name = db_name
+        self.password_hasher = password_hasher or PasswordHasher()
+        self.slow_query_log = SlowQueryLog(slow_query_threshold) if slow_query_threshold is not None else None
+        self.pool = ConnectionPool(db_name, size=pool_size, busy_timeout=busy_timeout,
+                                   slow_query_log=self.slow_query_log)
+        self.question_bank = QuestionBank(self._load_questions, self._load_answer_data,
+                                          self._load_theme_versions, refresh_interval=question_refresh)
+        self.migrate()
+        self.question_bank.refresh(force=True)
+        self.usage_tracker = UsageTracker(self._write_usage, interval=usage_flush_interval,
+                                          max_pending=usage_flush_size)
+        self.top_scores = TopScores(capacity=leaderboard_size)
+        self.score_ranks = ScoreRanks()
+        self.leaderboard_refresh = leaderboard_refresh
+        self._scores_sync_lock = threading.Lock()
+        self._seed_top_scores()
+        self.score_writer = BatchWriter(self._write_scores, batch_size=score_batch_size,
+                                        max_queue=score_queue_size, name='score-writer',
+                                        on_failure=self._save_scores_one_by_one)
+        self.seen_writer = BatchWriter(self._write_seen, batch_size=score_batch_size,
+                                       max_queue=score_queue_size, name='seen-writer')
+        self.seen_questions = SeenQuestions(self._load_seen, self._queue_seen, max_users=seen_cache_size)
+
+    def migrate(self):
+        """Applique les migrations du schéma qui n'ont pas encore été jouées"""
+        with self.pool.connection() as conn:
+            # BEGIN IMMEDIATE sérialise les workers qui démarrent en même temps
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target_version, migration in MIGRATIONS:
+                if target_version > version:
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version = {target_version}")
+                    version = target_version
+            conn.commit()
+        return version
+
+    def check_query_plans(self):
+        """Vérifie avec EXPLAIN QUERY PLAN que les requêtes chaudes utilisent leurs index"""
+        plans = []
+        with self.pool.connection() as conn:
+            for sql, params, index_name in HOT_QUERIES:
+                plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+                plans.append((index_name, plan))
+                # Exceptions explicites plutôt qu'assert, pour que la vérification tienne aussi sous python -O
+                if not any(index_name in step for step in plan):
+                    raise RuntimeError(f"L'index {index_name} n'est pas utilisé : {plan}")
+                if any('TEMP B-TREE' in step for step in plan):
+                    raise RuntimeError(f"Tri temporaire pour la requête utilisant {index_name} : {plan}")
+        return plans
 
     def add_user(self, username, password):
         """Ajoute un nouvel utilisateur"""
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        password_hash = self.password_hasher.hash(password)
         try:
-            self.cursor.execute('''
-            INSERT INTO users (username, password_hash)
-            VALUES (?, ?)
-            ''', (username, password_hash))
-            self.conn.commit()
+            with self.pool.connection() as conn:
+                conn.execute('''
+                INSERT INTO users (username, password_hash)
+                VALUES (?, ?)
+                ''', (username, password_hash))
+                conn.commit()
             return True
         except sqlite3.IntegrityError:
             return False
 
     def verify_user(self, username, password):
         """Vérifie les identifiants d'un utilisateur"""
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        self.cursor.execute('''
-        SELECT user_id FROM users
-        WHERE username = ? AND password_hash = ?
-        ''', (username, password_hash))
-        result = self.cursor.fetchone()
-        return result[0] if result else None
+        with self.pool.connection() as conn:
+            result = conn.execute('''
+            SELECT user_id, password_hash FROM users
+            WHERE username = ?
+            ''', (username,)).fetchone()
+        if not result:
+            return None
+
+        user_id, stored_hash = result
+        valid, needs_rehash = self.password_hasher.verify(password, stored_hash)
+        if not valid:
+            return None
+        if needs_rehash:
+            # Migration transparente des anciennes empreintes SHA-256 vers scrypt, calculée
+            # avant de prendre une connexion ; reportée à la prochaine connexion si le pool est saturé
+            try:
+                new_hash = self.password_hasher.hash(password)
+            except PasswordHasherBusy:
+                print(f"Mise à jour de l'empreinte de l'utilisateur {user_id} reportée : hachage saturé")
+                return user_id
+            with self.pool.connection() as conn:
+                conn.execute("UPDATE users SET password_hash = ? WHERE user_id = ?", (new_hash, user_id))
+                conn.commit()
+        return user_id
+
+    def add_theme(self, theme_name):
+        """Ajoute un thème s'il n'existe pas et renvoie son identifiant"""
+        with self.pool.connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO themes (theme_name) VALUES (?)", (theme_name,))
+            conn.commit()
+            result = conn.execute("SELECT theme_id FROM themes WHERE theme_name = ?", (theme_name,)).fetchone()
+        return result[0]
 
     def add_question(self, theme_id, question_type, question_text, correct_answer, wrong_answers=None):
-        """Ajoute une nouvelle question"""
+        """Ajoute une nouvelle question ; renvoie False si elle existe déjà"""
         try:
-            wrong_answer1 = wrong_answers[0] if wrong_answers else None
-            wrong_answer2 = wrong_answers[1] if wrong_answers and len(wrong_answers) > 1 else None
-            wrong_answer3 = wrong_answers[2] if wrong_answers and len(wrong_answers) > 2 else None
-
-            self.cursor.execute('''
-            INSERT INTO questions (
-                theme_id, question_type, points, question_text, 
-                correct_answer, wrong_answer1, wrong_answer2, wrong_answer3
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (theme_id, question_type.value, question_type.value, question_text,
-                 correct_answer, wrong_answer1, wrong_answer2, wrong_answer3))
-            self.conn.commit()
+            row = question_row(theme_id, question_type, question_text, correct_answer, wrong_answers)
+            with self.pool.connection() as conn:
+                cursor = conn.execute(SQL_INSERT_QUESTION, row)
+                if cursor.rowcount == 1:
+                    conn.execute(SQL_BUMP_THEME_VERSION, (theme_id,))
+                conn.commit()
+            if cursor.rowcount != 1:
+                return False
+            self.question_bank.invalidate(_theme_key(theme_id), question_type)
             return True
         except Exception as e:
             print(f"Erreur lors de l'ajout de la question: {e}")
             return False
 
-    def get_questions_for_game(self, theme_id):
-        """Récupère les questions pour une partie en évitant les répétitions"""
+    def insert_question_rows(self, rows, aliases=()):
+        """Insère un lot de lignes construites par question_row en une transaction ; renvoie le nombre inséré
+
+        aliases contient des couples (alias, content_hash).
+        """
+        with self.pool.connection() as conn:
+            before = conn.total_changes
+            conn.executemany(SQL_INSERT_QUESTION, rows)
+            inserted = conn.total_changes - before
+            conn.executemany(SQL_INSERT_ALIAS_BY_HASH, aliases)
+            conn.executemany(SQL_BUMP_THEME_VERSION, [(theme_id,) for theme_id in {row[0] for row in rows}])
+            conn.commit()
+            return inserted
+
+    def add_alias(self, question_id, alias):
+        """Ajoute une réponse alternative acceptée pour une question"""
+        with self.pool.connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO question_aliases (question_id, alias) VALUES (?, ?)",
+                         (question_id, alias))
+            conn.execute(SQL_BUMP_QUESTION_THEME_VERSION, (question_id,))
+            conn.commit()
+        self.question_bank.remember_matcher(question_id, self._load_matcher(question_id))
+
+    def set_answer_tolerance(self, theme_id, tolerance):
+        """Règle le nombre de fautes de frappe tolérées pour les questions ouvertes d'un thème"""
+        with self.pool.connection() as conn:
+            conn.execute("UPDATE themes SET answer_tolerance = ? WHERE theme_id = ?", (tolerance, theme_id))
+            conn.execute(SQL_BUMP_THEME_VERSION, (theme_id,))
+            conn.commit()
+        self.question_bank.invalidate(_theme_key(theme_id))
+
+    def _load_theme_versions(self):
+        """Version du contenu de chaque thème, pour QuestionBank.refresh"""
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT theme_id, content_version FROM themes").fetchall()
+
+    def _load_questions(self, theme_id, q_type):
+        """Charge toutes les questions d'un thème et d'un type pour le cache"""
+        # Les compteurs en attente doivent être en base avant de recharger le pool
+        self.usage_tracker.flush()
+        with self.pool.connection() as conn:
+            return conn.execute(SQL_LOAD_QUESTIONS, (theme_id, q_type.value)).fetchall()
+
+    def get_questions_for_game(self, theme_id, user_ids=()):
+        """Récupère les questions pour une partie en évitant les répétitions
+
+        user_ids : joueurs de la partie, qui reçoivent en priorité des questions
+        qu'aucun d'eux n'a encore vues.
+        """
         questions = {
             QuestionType.OPEN: [],
             QuestionType.QUAD: [],
             QuestionType.DUAL: []
         }
-        
+
+        theme_id = _theme_key(theme_id)
+        if theme_id is None:
+            return questions
+
         current_time = time.strftime('%Y-%m-%d %H:%M:%S')
-        
+        selected_ids = []
+        user_ids = [user_id for user_id in map(_user_key, user_ids) if user_id is not None]
+        seen = self.seen_questions.seen_by_any(user_ids) if user_ids else None
+
         for q_type in QuestionType:
-            # Sélectionne les questions les moins utilisées en priorité
-            self.cursor.execute('''
-            SELECT * FROM questions 
-            WHERE theme_id = ? AND question_type = ?
-            ORDER BY used_count ASC, last_used ASC, RANDOM()
-            LIMIT ?
-            ''', (theme_id, q_type.value, 
-                 5 if q_type == QuestionType.OPEN else 
-                 10 if q_type == QuestionType.QUAD else 20))
-            
-            selected_questions = self.cursor.fetchall()
+            # Sélectionne en mémoire les questions les moins utilisées en priorité
+            selected_questions = self.question_bank.pool(theme_id, q_type).select(
+                QUESTIONS_PER_GAME[q_type], current_time, seen)
             questions[q_type] = selected_questions
-            
-            # Met à jour le compteur d'utilisation pour les questions sélectionnées
-            for question in selected_questions:
-                self.cursor.execute('''
-                UPDATE questions 
-                SET used_count = used_count + 1,
-                    last_used = ?
-                WHERE question_id = ?
-                ''', (current_time, question[0]))
-            
-            self.conn.commit()
-            
+            selected_ids.extend(question[0] for question in selected_questions)
+
+        # Les compteurs d'utilisation et les questions vues sont écrits plus tard, par lots
+        self.usage_tracker.record(selected_ids, current_time)
+        if user_ids:
+            self.seen_questions.mark_seen(user_ids, selected_ids)
+
         return questions
 
+    def _load_seen(self, user_id):
+        """Bitmap des questions déjà vues par un joueur, ou None"""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT seen FROM user_seen_questions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def _queue_seen(self, user_id, seen):
+        if not self.seen_writer.submit((user_id, seen)):
+            print(f"File d'écriture des questions vues pleine, historique de {user_id} non enregistré")
+
+    def _write_seen(self, items):
+        """Enregistre un lot de bitmaps, fusionnées avec celles écrites entre-temps par les autres workers"""
+        # Bitmaps d'un même joueur fusionnées : elles peuvent arriver dans le désordre
+        latest = {}
+        for user_id, seen in items:
+            if user_id in latest:
+                seen = QuestionBitset(seen).union(QuestionBitset(latest[user_id])).to_bytes()
+            latest[user_id] = seen
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stored = dict(conn.execute(
+                f"SELECT user_id, seen FROM user_seen_questions WHERE user_id IN ({','.join('?' * len(latest))})",
+                list(latest)).fetchall())
+            rows = []
+            for user_id, seen in latest.items():
+                if user_id in stored:
+                    seen = QuestionBitset(seen).union(QuestionBitset(stored[user_id])).to_bytes()
+                rows.append((user_id, seen))
+            conn.executemany('''
+            INSERT INTO user_seen_questions (user_id, seen) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET seen = excluded.seen
+            ''', rows)
+            conn.commit()
+
+    def _write_usage(self, usage):
+        """Applique en une transaction les compteurs accumulés par le UsageTracker"""
+        with self.pool.connection() as conn:
+            conn.executemany('''
+            UPDATE questions 
+            SET used_count = used_count + ?,
+                last_used = ?
+            WHERE question_id = ?
+            ''', [(count, last_used, question_id)
+                  for question_id, (count, last_used) in usage.items()])
+            conn.commit()
+
+    def _load_answer_data(self, theme_id, q_type):
+        """Charge les alias des questions d'un pool et la tolérance du thème"""
+        aliases = {}
+        with self.pool.connection() as conn:
+            for question_id, alias in conn.execute('''
+                SELECT question_aliases.question_id, question_aliases.alias
+                FROM question_aliases
+                JOIN questions ON questions.question_id = question_aliases.question_id
+                WHERE questions.theme_id = ? AND questions.question_type = ?
+            ''', (theme_id, q_type.value)):
+                aliases.setdefault(question_id, []).append(alias)
+            row = conn.execute("SELECT answer_tolerance FROM themes WHERE theme_id = ?", (theme_id,)).fetchone()
+        return aliases, row[0] if row else 0
+
+    def _load_matcher(self, question_id):
+        """Construit les réponses acceptées d'une seule question"""
+        row = self.get_question(question_id)
+        with self.pool.connection() as conn:
+            aliases = [alias for (alias,) in conn.execute(
+                "SELECT alias FROM question_aliases WHERE question_id = ?", (question_id,))]
+            tolerance = conn.execute("SELECT answer_tolerance FROM themes WHERE theme_id = ?",
+                                     (row[1],)).fetchone()
+        tolerance = tolerance[0] if tolerance and row[2] == QuestionType.OPEN.value else 0
+        return AnswerMatcher(row[5], aliases, tolerance)
+
+    def check_answer(self, question_id, user_answer):
+        """Vrai si la réponse du joueur est acceptée pour cette question"""
+        matcher = self.question_bank.matcher(question_id)
+        if matcher is None:
+            matcher = self._load_matcher(question_id)
+            self.question_bank.remember_matcher(question_id, matcher)
+        return matcher.matches(user_answer)
+
+    def get_question(self, question_id):
+        """Récupère une question par son identifiant, depuis le cache si possible"""
+        row = self.question_bank.get(question_id)
+        if row is None:
+            with self.pool.connection() as conn:
+                row = conn.execute('''
+                SELECT question_id, theme_id, question_type, points, question_text,
+                       correct_answer, wrong_answer1, wrong_answer2, wrong_answer3
+                FROM questions
+                WHERE question_id = ?
+                ''', (question_id,)).fetchone()
+            if row is not None:
+                self.question_bank.remember(row)
+        return row
+
+    def get_question_payload(self, question_id):
+        """JSON compact d'une question pour le client (sans la bonne réponse), mis en cache"""
+        encoded = self.question_bank.payload(question_id)
+        if encoded is None and self.get_question(question_id) is not None:
+            encoded = self.question_bank.payload(question_id)
+        return encoded
+
     def get_all_themes(self):
         """Récupère tous les thèmes"""
-        self.cursor.execute("SELECT theme_id, theme_name FROM themes")
-        return self.cursor.fetchall()
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT theme_id, theme_name FROM themes").fetchall()
 
-    def save_score(self, user_id, theme_id, score, total_time):
-        """Enregistre un score"""
+    def save_score(self, user_id, theme_id, score, total_time, answered=0, correct=0):
+        """Enregistre un score et met à jour les statistiques du joueur"""
         try:
-            self.cursor.execute('''
-            INSERT INTO scores (user_id, theme_id, score, total_time)
-            VALUES (?, ?, ?, ?)
-            ''', (user_id, theme_id, score, total_time))
-            self.conn.commit()
+            with self.pool.connection() as conn:
+                cursor = conn.execute(SQL_INSERT_SCORE, (user_id, theme_id, score, total_time))
+                conn.execute(SQL_ROLLUP_USER_STATS,
+                             _stats_row(user_id, theme_id, score, total_time, answered, correct))
+                conn.commit()
+                score_id = cursor.lastrowid
+                names = conn.execute('''
+                SELECT users.username, themes.theme_name
+                FROM users, themes
+                WHERE users.user_id = ? AND themes.theme_id = ?
+                ''', (user_id, theme_id)).fetchone()
+            if names:
+                self.top_scores.add(score_id, _theme_key(theme_id), names[0], names[1], score, total_time)
             return True
         except Exception:
             return False
 
+    def queue_score(self, user_id, theme_id, score, total_time, answered=0, correct=0):
+        """Met un score en file pour l'écriture par lots, ou l'enregistre tout de suite si la file est pleine
+
+        answered et correct (questions répondues, bonnes réponses) alimentent les statistiques du joueur.
+        """
+        if self.score_writer.submit((user_id, theme_id, score, total_time, answered, correct)):
+            return True
+        return self.save_score(user_id, theme_id, score, total_time, answered, correct)
+
+    def _write_scores(self, scores):
+        """Insère un lot de scores et cumule les statistiques des joueurs en une transaction,
+        puis met à jour le classement"""
+        with self.pool.connection() as conn:
+            conn.executemany(SQL_INSERT_SCORE, [score[:4] for score in scores])
+            conn.executemany(SQL_ROLLUP_USER_STATS, [_stats_row(*score) for score in scores])
+            conn.commit()
+        # Le lot est écrit : une erreur ici ne doit pas le faire retenter, au risque de doublons
+        try:
+            self._sync_top_scores(force=True)
+        except Exception as e:
+            print(f"Erreur lors de la mise à jour du classement: {e}")
+
+    def _save_scores_one_by_one(self, scores):
+        """Dernier recours pour un lot en échec : une transaction par score ; renvoie les scores non enregistrés"""
+        return [score for score in scores if not self.save_score(*score)]
+
+    def _seed_top_scores(self):
+        """Remplit le classement en mémoire à partir des meilleurs scores en base"""
+        capacity = self.top_scores.capacity
+        with self.pool.connection() as conn:
+            last_score_id = conn.execute("SELECT COALESCE(MAX(score_id), 0) FROM scores").fetchone()[0]
+            rows = conn.execute(SQL_TOP_SCORES_SEED_GLOBAL, (capacity,)).fetchall()
+            for (theme_id,) in conn.execute("SELECT theme_id FROM themes").fetchall():
+                rows.extend(conn.execute(SQL_TOP_SCORES_SEED_THEME, (theme_id, capacity)).fetchall())
+            counts = conn.execute(SQL_SCORE_COUNTS, (last_score_id,)).fetchall()
+        for row in rows:
+            self.top_scores.add(*row)
+        for theme_id, score, count in counts:
+            self.score_ranks.add(theme_id, score, count)
+        self._scores_synced_id = last_score_id
+        self._scores_synced_at = time.monotonic()
+
+    def _sync_top_scores(self, force=False):
+        """Intègre les scores enregistrés par lots ou par les autres workers depuis la dernière synchronisation"""
+        if not force and time.monotonic() - self._scores_synced_at < self.leaderboard_refresh:
+            return
+        with self._scores_sync_lock:
+            if not force and time.monotonic() - self._scores_synced_at < self.leaderboard_refresh:
+                return
+            with self.pool.connection() as conn:
+                rows = conn.execute(SQL_SCORES_SINCE, (self._scores_synced_id,)).fetchall()
+            for row in rows:
+                self.top_scores.add(*row)
+                self.score_ranks.add(row[1], row[4])
+                self._scores_synced_id = row[0]
+            self._scores_synced_at = time.monotonic()
+
     def get_top_scores(self, theme_id=None, limit=10):
         """Récupère les meilleurs scores"""
         if theme_id:
-            self.cursor.execute('''
-            SELECT users.username, scores.score, scores.total_time
-            FROM scores
-            JOIN users ON scores.user_id = users.user_id
-            WHERE scores.theme_id = ?
-            ORDER BY scores.score DESC, scores.total_time ASC
-            LIMIT ?
-            ''', (theme_id, limit))
+            theme_id = _theme_key(theme_id)
+            if theme_id is None:
+                return []
         else:
-            self.cursor.execute('''
-            SELECT users.username, themes.theme_name, scores.score, scores.total_time
-            FROM scores
-            JOIN users ON scores.user_id = users.user_id
-            JOIN themes ON scores.theme_id = themes.theme_id
-            ORDER BY scores.score DESC, scores.total_time ASC
-            LIMIT ?
-            ''', (limit,))
-        return self.cursor.fetchall()
+            theme_id = None
+
+        if limit <= self.top_scores.capacity:
+            self._sync_top_scores()
+            return self.top_scores.top(theme_id, limit)
+
+        # Au-delà de la taille du cache, on interroge directement la base
+        with self.pool.connection() as conn:
+            if theme_id is not None:
+                cursor = conn.execute(SQL_TOP_SCORES_THEME, (theme_id, limit))
+            else:
+                cursor = conn.execute(SQL_TOP_SCORES_GLOBAL, (limit,))
+            return cursor.fetchall()
+
     def get_leaderboard(self, theme_id=None, limit=10):
         """Récupère le classement en utilisant get_top_scores"""
         return self.get_top_scores(theme_id, limit)
 
+    def get_scores_page(self, theme_id=None, limit=10, after=None):
+        """Page du classement qui suit le curseur `after` = (score, total_time, score_id)
+
+        Renvoie (lignes, curseur de la page suivante ou None).
+        """
+        theme_id = _theme_key(theme_id) if theme_id else None
+        by_theme = theme_id is not None
+        prefix = (theme_id,) if by_theme else ()
+        # Une ligne de plus que demandé : sa présence indique qu'il existe une page suivante
+        fetch = limit + 1
+        with self.pool.connection() as conn:
+            if after is None:
+                rows = conn.execute(SQL_SCORES_FIRST[by_theme], prefix + (fetch,)).fetchall()
+            else:
+                score, total_time, score_id = after
+                rows = conn.execute(SQL_SCORES_TIES_AFTER[by_theme],
+                                    prefix + (score, total_time, total_time, score_id, fetch)).fetchall()
+                if len(rows) < fetch:
+                    rows += conn.execute(SQL_SCORES_BELOW[by_theme],
+                                         prefix + (score, fetch - len(rows))).fetchall()
+        cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            cursor = (rows[-1][3], rows[-1][4], rows[-1][0])
+        return [_ranked_row(row, by_theme) for row in rows], cursor
+
+    def get_user_rank(self, user_id, theme_id=None, neighbours=5):
+        """Rang du meilleur score du joueur et les scores qui l'entourent, ou None s'il n'a pas joué
+
+        Les scores strictement meilleurs sont comptés en mémoire en O(log n) ; seuls les
+        ex æquo plus rapides sont comptés en base, par un parcours d'index borné.
+        """
+        user_id = _user_key(user_id)
+        theme_id = _theme_key(theme_id) if theme_id else None
+        if user_id is None:
+            return None
+        by_theme = theme_id is not None
+        prefix = (theme_id,) if by_theme else ()
+        self._sync_top_scores()
+
+        with self.pool.connection() as conn:
+            best = conn.execute(SQL_USER_BEST_SCORE[by_theme], (user_id,) + prefix).fetchone()
+            if best is None:
+                return None
+            score, total_time, score_id = best
+            key = (score, total_time, total_time, score_id)
+            ties_before = conn.execute(SQL_COUNT_TIES_BEFORE[by_theme], prefix + key).fetchone()[0]
+            above = conn.execute(SQL_SCORES_TIES_BEFORE[by_theme], prefix + key + (neighbours,)).fetchall()
+            if len(above) < neighbours:
+                above += conn.execute(SQL_SCORES_ABOVE[by_theme],
+                                      prefix + (score, neighbours - len(above))).fetchall()
+            below = conn.execute(SQL_SCORES_TIES_AFTER[by_theme], prefix + key + (neighbours,)).fetchall()
+            if len(below) < neighbours:
+                below += conn.execute(SQL_SCORES_BELOW[by_theme],
+                                      prefix + (score, neighbours - len(below))).fetchall()
+
+        rank = self.score_ranks.scores_above(theme_id, score) + ties_before + 1
+        above.reverse()
+        return {
+            'rank': rank,
+            'score': score,
+            'total_time': total_time,
+            'above': [(rank - len(above) + i, *_ranked_row(row, by_theme)) for i, row in enumerate(above)],
+            'below': [(rank + 1 + i, *_ranked_row(row, by_theme)) for i, row in enumerate(below)]
+        }
+
+    def get_user_stats(self, user_id):
+        """Statistiques cumulées du joueur, par thème et au total"""
+        user_id = _user_key(user_id)
+        if user_id is None:
+            return None
+        with self.pool.connection() as conn:
+            rows = conn.execute(SQL_USER_STATS, (user_id,)).fetchall()
+
+        themes = []
+        totals = {'games_played': 0, 'total_score': 0, 'best_score': 0,
+                  'questions_answered': 0, 'correct_answers': 0, 'total_time': 0.0, 'answered_time': 0.0}
+        for (theme_id, theme_name, games, total_score, best_score, best_time, answered, correct,
+             total_time, answered_time) in rows:
+            stats = {'theme_id': theme_id, 'theme_name': theme_name, 'games_played': games,
+                     'total_score': total_score, 'best_score': best_score, 'best_time': best_time,
+                     'questions_answered': answered, 'correct_answers': correct, 'total_time': total_time,
+                     'answered_time': answered_time}
+            themes.append(_with_ratios(stats))
+            for key in totals:
+                totals[key] = max(totals[key], stats[key]) if key == 'best_score' else totals[key] + stats[key]
+        return {'themes': themes, 'overall': _with_ratios(totals)}
+
     def close(self):
-        """Ferme la connexion à la base de données"""
-        self.conn.close()
+        """Vide les tampons d'écriture puis ferme les connexions à la base de données"""
+        self.score_writer.close()
+        self.seen_writer.close()
+        self.usage_tracker.close()
+        self.password_hasher.close()
+        self.pool.close()
+
+
+if __name__ == '__main__':
+    # python quiz_database.py [fichier.db] : migre la base et affiche les plans des requêtes chaudes
+    import sys
+    database = QuizDatabase(sys.argv[1] if len(sys.argv) > 1 else 'quiz.db')
+    for index_name, plan in database.check_query_plans():
+        print(f"{index_name}: {' | '.join(plan)}")
+    database.close()
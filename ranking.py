@@ -0,0 +1,84 @@
+class FenwickTree:
+    """Arbre de Fenwick : sommes de préfixes et mises à jour ponctuelles en O(log n)
+
+    `tree` est une simple liste d'entiers (taille n + 1), qui peut donc être
+    gardée telle quelle dans un état sérialisé en JSON.
+    """
+    __slots__ = ('tree',)
+
+    def __init__(self, tree):
+        self.tree = tree
+
+    @classmethod
+    def of_size(cls, size):
+        return cls([0] * (size + 1))
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, index, delta):
+        """Ajoute delta à la case `index` (à partir de 0)"""
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index):
+        """Somme des cases 0 à index incluses"""
+        total = 0
+        i = min(index + 1, len(self.tree) - 1)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def total(self):
+        return self.prefix_sum(len(self.tree) - 2)
+
+    def resized(self, size):
+        """Copie de l'arbre avec `size` cases, les valeurs existantes conservées"""
+        grown = FenwickTree.of_size(size)
+        previous = 0
+        for index in range(min(size, len(self))):
+            current = self.prefix_sum(index)
+            if current != previous:
+                grown.add(index, current - previous)
+            previous = current
+        return grown
+
+
+class ScoreRanking:
+    """Nombre de joueurs par score, pour connaître un rang sans trier tout le salon"""
+    __slots__ = ('counts',)
+
+    def __init__(self, counts):
+        self.counts = counts if isinstance(counts, FenwickTree) else FenwickTree(counts)
+
+    @classmethod
+    def for_max_score(cls, max_score):
+        return cls(FenwickTree.of_size(max_score + 1))
+
+    def _clamp(self, score):
+        return max(0, min(score, len(self.counts) - 1))
+
+    def add(self, score, count=1):
+        self.counts.add(self._clamp(score), count)
+
+    def ensure_score(self, score):
+        """Agrandit le classement pour qu'il distingue les scores jusqu'à `score` inclus"""
+        if score >= len(self.counts):
+            self.counts = self.counts.resized(max(score + 1, 2 * len(self.counts)))
+
+    def move(self, old_score, new_score):
+        """Un joueur passe de old_score à new_score"""
+        if self._clamp(old_score) != self._clamp(new_score):
+            self.counts.add(self._clamp(old_score), -1)
+            self.counts.add(self._clamp(new_score), 1)
+
+    def players_above(self, score):
+        """Nombre de joueurs ayant strictement plus que `score`"""
+        return self.counts.total() - self.counts.prefix_sum(self._clamp(score))
+
+    def rank(self, score):
+        """Rang (à partir de 1) d'un joueur ayant `score` ; les ex æquo partagent le rang"""
+        return self.players_above(score) + 1
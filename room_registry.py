@@ -0,0 +1,88 @@
+import random
+import threading
+
+
+class RoomRegistry:
+    """Salons de duel : codes attribués sans collision et modifications verrouillées par salon
+
+    Les codes libres sont tirés d'une liste mélangée de tout l'espace des codes, en O(1).
+    Un code n'est réutilisé qu'une fois la liste épuisée, quand elle est reconstruite à partir
+    des salons encore ouverts : ceux purgés entre-temps rendent ainsi leur code.
+    Chaque salon est protégé par l'un des `stripes` verrous (verrouillage par bandes) :
+    deux salons différents se modifient en parallèle, un même salon jamais.
+    """
+
+    MAX_RETRIES = 50
+
+    def __init__(self, rooms, code_digits=4, stripes=64, capacity=50):
+        self.rooms = rooms
+        self.code_digits = code_digits
+        self.capacity = capacity
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._free_lock = threading.Lock()
+        self._free_codes = self._shuffled_codes()
+
+    def _shuffled_codes(self):
+        codes = list(range(10 ** self.code_digits))
+        random.shuffle(codes)
+        return codes
+
+    def _format(self, number):
+        return str(number).zfill(self.code_digits)
+
+    def _lock_for(self, room_code):
+        return self._stripes[hash(room_code) % len(self._stripes)]
+
+    def _next_free_code(self):
+        with self._free_lock:
+            if not self._free_codes:
+                # Liste épuisée : on récupère les codes des salons purgés depuis,
+                # en lisant les salons ouverts en une seule fois
+                open_codes = set(self.rooms.keys())
+                self._free_codes = [number for number in self._shuffled_codes()
+                                    if self._format(number) not in open_codes]
+                if not self._free_codes:
+                    raise RuntimeError("Plus aucun code de salon disponible")
+            return self._format(self._free_codes.pop())
+
+    def create(self, state):
+        """Enregistre un nouveau salon et renvoie son code"""
+        while True:
+            room_code = self._next_free_code()
+            # create() échoue si un autre worker a déjà pris ce code : on passe au suivant
+            if self.rooms.create(room_code, state):
+                return room_code
+
+    def get(self, room_code):
+        return self.rooms.get(room_code)
+
+    def update(self, room_code, mutate):
+        """Applique `mutate` au salon sous son verrou et renvoie son résultat ; KeyError si inconnu
+
+        `mutate` s'exécute hors du verrou global du stockage, seul le verrou du salon est tenu.
+        La version du stockage détecte encore les modifications faites par un autre worker.
+        """
+        with self._lock_for(room_code):
+            for _ in range(self.MAX_RETRIES):
+                version, room = self.rooms.get_versioned(room_code)
+                if version is None:
+                    raise KeyError(room_code)
+                result = mutate(room)
+                if self.rooms.compare_and_set(room_code, version, room):
+                    return result
+        raise RuntimeError(f"Trop de modifications concurrentes pour le salon {room_code}")
+
+    def join(self, room_code, user_id):
+        """Ajoute un joueur de façon atomique ; renvoie un message d'erreur ou None"""
+        def add_player(room):
+            if room['game_started']:
+                return 'Le jeu a déjà commencé'
+            if any(player['user_id'] == user_id for player in room['players']):
+                return 'Utilisateur déjà dans la salle'
+            if len(room['players']) >= self.capacity:
+                return 'Salle complète'
+            room['players'].append({'user_id': user_id, 'is_host': False})
+            room['version'] += 1
+            return None
+
+        return self.update(room_code, add_player)
@@ -48,12 +48,12 @@ class QuizAPI {
         }
     }
 
-    static async startGame(theme_id, user_id) {
+    static async startGame(theme_id, user_id, prefetch = false) {
         try {
             const response = await fetch(`${API_CONFIG.BASE_URL}/start_game`, {
                 method: 'POST',
                 headers: API_CONFIG.HEADERS,
-                body: JSON.stringify({ theme_id, user_id })
+                body: JSON.stringify({ theme_id, user_id, prefetch })
             });
             return await response.json();
         } catch (error) {
@@ -62,13 +62,15 @@ class QuizAPI {
         }
     }
 
-    static async submitAnswer(gameId, answer, timeTaken) {
+    // gameToken : jeton signé de la partie si le serveur est en mode sans état, sinon null
+    static async submitAnswer(gameId, answer, timeTaken, gameToken = null) {
         try {
             const response = await fetch(`${API_CONFIG.BASE_URL}/submit_answer`, {
                 method: 'POST',
                 headers: API_CONFIG.HEADERS,
                 body: JSON.stringify({
                     game_id: gameId,
+                    game_token: gameToken,
                     answer: answer,
                     time_taken: timeTaken
                 })
@@ -80,6 +82,25 @@ class QuizAPI {
         }
     }
 
+    // answers : [{ answer, time_taken }, ...] dans l'ordre des questions restantes
+    static async submitAnswers(gameId, answers, gameToken = null) {
+        try {
+            const response = await fetch(`${API_CONFIG.BASE_URL}/submit_answers`, {
+                method: 'POST',
+                headers: API_CONFIG.HEADERS,
+                body: JSON.stringify({
+                    game_id: gameId,
+                    game_token: gameToken,
+                    answers: answers
+                })
+            });
+            return await response.json();
+        } catch (error) {
+            console.error('Erreur de soumission des réponses:', error);
+            return { status: 'error', message: 'Erreur de connexion au serveur' };
+        }
+    }
+
     static async getLeaderboard(theme = 'general') {
         try {
             const response = await fetch(`${API_CONFIG.BASE_URL}/leaderboard?theme=${theme}`, {
@@ -120,9 +141,12 @@ class QuizAPI {
         }
     }
 
-    static async getRoomPlayers(room_code, user_id) {
+    static async getRoomPlayers(room_code, user_id, since = null, wait = null) {
         try {
-            const response = await fetch(`${API_CONFIG.BASE_URL}/room_players?room_code=${room_code}&user_id=${user_id}`, {
+            let url = `${API_CONFIG.BASE_URL}/room_players?room_code=${room_code}&user_id=${user_id}`;
+            if (since !== null) url += `&since=${since}`;
+            if (wait !== null) url += `&wait=${wait}`;
+            const response = await fetch(url, {
                 headers: API_CONFIG.HEADERS
             });
             return await response.json();
@@ -237,27 +261,32 @@ async function updatePlayerList() {
     const response = await QuizAPI.getRoomPlayers(currentRoomCode, userId);
     
     if (response.status === 'success') {
-        const playerList = document.getElementById('playerList');
-        playerList.innerHTML = '';
-        
-        response.players.forEach(player => {
-            const div = document.createElement('div');
-            div.className = 'player-item';
-            div.innerHTML = `
-                <span>${player.username}</span>
-                ${player.is_host ? '<span class="host-badge">Hôte</span>' : ''}
-            `;
-            playerList.appendChild(div);
-        });
+        renderLobby(response);
+    }
+}
 
-        if (isHost) {
-            const startButton = document.getElementById('startButton');
-            startButton.disabled = response.players.length < 2;
-        }
+function renderLobby(lobby) {
+    const playerList = document.getElementById('playerList');
+    playerList.innerHTML = '';
+    
+    lobby.players.forEach(player => {
+        const div = document.createElement('div');
+        div.className = 'player-item';
+        div.innerHTML = `
+            <span>${player.username}</span>
+            ${player.is_host ? '<span class="host-badge">Hôte</span>' : ''}
+        `;
+        playerList.appendChild(div);
+    });
 
-        if (response.game_started) {
-            window.location.href = 'quiz.html';
-        }
+    if (isHost) {
+        const startButton = document.getElementById('startButton');
+        startButton.disabled = lobby.players.length < 2;
+    }
+
+    if (lobby.game_started) {
+        stopPlayerUpdates();
+        window.location.href = 'quiz.html';
     }
 }
 
@@ -318,6 +347,7 @@ function backToMenu() {
     
     if (currentRoomCode) {
         // Nettoyer les données du salon
+        stopPlayerUpdates();
         currentRoomCode = '';
         isHost = false;
     }
@@ -353,11 +383,59 @@ function updateLeaderboardDisplay(scores) {
     leaderboardContent.innerHTML = html;
 }
 
-// Fonction pour démarrer les mises à jour de la liste des joueurs
+// Mises à jour de la liste des joueurs : flux SSE, ou long-poll si le navigateur ne le permet pas
+let lobbyEvents = null;
+let lobbyPolling = false;
+
 function startPlayerUpdates() {
-    setInterval(() => {
-        updatePlayerList();
-    }, 2000);
+    stopPlayerUpdates();
+
+    if (window.EventSource) {
+        lobbyEvents = new EventSource(`${API_CONFIG.BASE_URL}/room_events?room_code=${currentRoomCode}`);
+        lobbyEvents.addEventListener('lobby', event => renderLobby(JSON.parse(event.data)));
+        lobbyEvents.addEventListener('closed', () => stopPlayerUpdates());
+        lobbyEvents.onerror = () => {
+            // Flux coupé (proxy, serveur) : on bascule sur le long-poll
+            if (lobbyEvents) {
+                lobbyEvents.close();
+                lobbyEvents = null;
+                pollPlayerUpdates();
+            }
+        };
+    } else {
+        pollPlayerUpdates();
+    }
+}
+
+async function pollPlayerUpdates() {
+    const userId = localStorage.getItem('user_id');
+    const roomCode = currentRoomCode;
+    let version = 0;
+    lobbyPolling = true;
+
+    while (lobbyPolling && roomCode === currentRoomCode) {
+        const response = await QuizAPI.getRoomPlayers(roomCode, userId, version, 25);
+        if (response.status !== 'success') {
+            if (response.message === 'Code de salle invalide') {
+                break;  // Salon fermé ou expiré
+            }
+            // Serveur injoignable : on patiente avant de réessayer
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            continue;
+        }
+        if (response.version > version) {
+            version = response.version;
+            renderLobby(response);
+        }
+    }
+}
+
+function stopPlayerUpdates() {
+    lobbyPolling = false;
+    if (lobbyEvents) {
+        lobbyEvents.close();
+        lobbyEvents = null;
+    }
 }
 // Ajoutez cette fonction dans script.js
 async function startQuiz() {
@@ -449,11 +527,11 @@ async function startGameWithTheme(themeId) {
 }
 
 function showQuestion(question) {
-    document.getElementById('questionText').textContent = question[4];
+    document.getElementById('questionText').textContent = question.text;
     const answersContainer = document.getElementById('answers');
     answersContainer.innerHTML = '';
     
-    if (question[2] === 5) { // Question ouverte
+    if (question.type === 5) { // Question ouverte
         const input = document.createElement('input');
         input.type = 'text';
         input.className = 'answer-input';
@@ -467,14 +545,8 @@ function showQuestion(question) {
         answersContainer.appendChild(input);
         answersContainer.appendChild(submitButton);
     } else {
-        const answers = [question[5]];
-        if (question[6]) answers.push(question[6]);
-        if (question[7]) answers.push(question[7]);
-        if (question[8]) answers.push(question[8]);
-        
-        answers.sort(() => Math.random() - 0.5);
-        
-        answers.forEach(answer => {
+        // Les propositions arrivent déjà mélangées par le serveur
+        question.options.forEach(answer => {
             if (answer) {
                 const button = document.createElement('button');
                 button.className = 'answer-button';
@@ -493,10 +565,13 @@ async function handleAnswer(answer) {
     const response = await QuizAPI.submitAnswer(
         currentGame.game_id,
         answer,
-        timeTaken
+        timeTaken,
+        currentGame.game_token || null
     );
     
     if (response.status === 'success') {
+        // Chaque réponse renvoie le jeton de l'étape suivante
+        if (response.game_token) currentGame.game_token = response.game_token;
         document.getElementById('score').textContent = currentGame.score;
         
         if (response.game_finished) {
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+
+class QuestionBitset:
+    """Ensemble d'identifiants de questions sous forme de bitmap : un bit par question_id"""
+    __slots__ = ('bits',)
+
+    def __init__(self, data=b''):
+        self.bits = bytearray(data)
+
+    def __contains__(self, question_id):
+        byte = question_id >> 3
+        return byte < len(self.bits) and (self.bits[byte] >> (question_id & 7)) & 1 == 1
+
+    def __len__(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    def add(self, question_id):
+        byte = question_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (question_id & 7)
+
+    def update(self, question_ids):
+        for question_id in question_ids:
+            self.add(question_id)
+
+    def union(self, other):
+        """Nouvel ensemble : questions présentes dans l'un ou l'autre"""
+        size = max(len(self.bits), len(other.bits))
+        merged = int.from_bytes(self.bits, 'little') | int.from_bytes(other.bits, 'little')
+        return QuestionBitset(merged.to_bytes(size, 'little'))
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+
+class SeenQuestions:
+    """Questions déjà vues par chaque joueur, gardées en mémoire pour les joueurs actifs
+
+    `loader(user_id)` lit la bitmap enregistrée (ou None) ; les modifications sont
+    confiées à `persist(user_id, bitset)`, qui les écrit en différé. Deux appels concurrents
+    peuvent transmettre leurs bitmaps dans le désordre : persist doit les fusionner.
+    """
+
+    def __init__(self, loader, persist, max_users=10000):
+        self.max_users = max_users
+        self._loader = loader
+        self._persist = persist
+        self._users = OrderedDict()  # user_id -> QuestionBitset, du moins au plus récemment actif
+        self._lock = threading.Lock()
+
+    def _load_missing(self, user_ids):
+        """Lit, hors du verrou, les bitmaps des joueurs absents du cache"""
+        with self._lock:
+            missing = [user_id for user_id in user_ids if user_id not in self._users]
+        return {user_id: QuestionBitset(self._loader(user_id) or b'') for user_id in missing}
+
+    def _bitset(self, user_id, loaded):
+        """Bitmap du joueur, à appeler sous le verrou avec le résultat de _load_missing"""
+        bitset = self._users.get(user_id)
+        if bitset is not None:
+            self._users.move_to_end(user_id)
+            return bitset
+        bitset = loaded.get(user_id)
+        if bitset is None:
+            # Évincée entre la lecture et la prise du verrou : cas rare, relue ici
+            bitset = QuestionBitset(self._loader(user_id) or b'')
+        self._users[user_id] = bitset
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return bitset
+
+    def seen_by_any(self, user_ids):
+        """Questions vues par au moins un des joueurs (copie)"""
+        loaded = self._load_missing(user_ids)
+        with self._lock:
+            seen = QuestionBitset()
+            for user_id in user_ids:
+                seen = seen.union(self._bitset(user_id, loaded))
+            return seen
+
+    def mark_seen(self, user_ids, question_ids):
+        """Ajoute les questions tirées à l'historique de chaque joueur"""
+        loaded = self._load_missing(user_ids)
+        with self._lock:
+            updated = []
+            for user_id in user_ids:
+                bitset = self._bitset(user_id, loaded)
+                bitset.update(question_ids)
+                updated.append((user_id, bitset.to_bytes()))
+        # Hors du verrou : persist peut attendre une place dans la file d'écriture
+        for user_id, seen in updated:
+            self._persist(user_id, seen)